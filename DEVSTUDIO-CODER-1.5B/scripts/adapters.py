@@ -0,0 +1,91 @@
+# scripts/adapters.py
+import os
+import glob
+import time
+import threading
+from contextlib import contextmanager
+
+from peft import PeftModel
+
+# Name that selects the plain base model with every adapter disabled
+BASE_ADAPTER = "base"
+
+
+def has_weights(path, prefix=""):
+    return any(glob.glob(os.path.join(path, f"{prefix}*{ext}")) for ext in (".safetensors", ".bin", ".pt"))
+
+
+def find_adapters(final_dir="models/final", checkpoints_dir="models/checkpoints"):
+    """Maps adapter names to directories for the final adapter and every saved training checkpoint."""
+    checkpoints = sorted(glob.glob(os.path.join(checkpoints_dir, "checkpoint-*")), key=lambda p: int(p.rsplit("-", 1)[-1]))
+    candidates = [final_dir] + checkpoints
+    return {os.path.basename(path): path for path in candidates if has_weights(path, "adapter_model")}
+
+
+class AdapterRegistry:
+    """Keeps several LoRA adapters attached to one resident base model and switches between them.
+
+    Only the small adapter matrices are loaded per adapter; switching flips which of them the
+    LoRA layers use, so no weights are copied or reloaded. Callers must hold the model lock
+    while an adapter is active.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.paths = {}
+        self.load_seconds = {}
+        self.active = None
+
+        self.metrics_lock = threading.Lock()
+        self.switches = 0
+        self.switch_seconds = 0.0
+
+    def load(self, name, path):
+        if name == BASE_ADAPTER:
+            raise ValueError(f"'{BASE_ADAPTER}' is reserved for the model without adapters")
+
+        start = time.perf_counter()
+        if isinstance(self.model, PeftModel):
+            self.model.load_adapter(path, adapter_name=name)
+        else:
+            self.model = PeftModel.from_pretrained(self.model, path, adapter_name=name)
+            self.active = name
+        self.model.eval()
+
+        self.paths[name] = path
+        self.load_seconds[name] = round(time.perf_counter() - start, 3)
+        print(f"Loaded adapter '{name}' from '{path}' in {self.load_seconds[name]:.2f}s.")
+
+    def names(self):
+        return [BASE_ADAPTER] + list(self.paths)
+
+    @contextmanager
+    def use(self, name):
+        """Runs the enclosed generation with the named adapter (or `base` for none) active."""
+        if name != BASE_ADAPTER and name not in self.paths:
+            raise ValueError(f"Unknown adapter '{name}' (available: {', '.join(self.names())})")
+
+        if name == BASE_ADAPTER:
+            with self.model.disable_adapter():
+                yield
+            return
+
+        if name != self.active:
+            start = time.perf_counter()
+            self.model.set_adapter(name)
+            seconds = time.perf_counter() - start
+            print(f"[adapters] Switched '{self.active}' -> '{name}' in {seconds * 1000:.2f}ms")
+            self.active = name
+            with self.metrics_lock:
+                self.switches += 1
+                self.switch_seconds += seconds
+        yield
+
+    def metrics(self):
+        with self.metrics_lock:
+            return {
+                "loaded": dict(self.load_seconds),
+                "active": self.active,
+                "switches": self.switches,
+                "mean_switch_ms": round(self.switch_seconds / self.switches * 1000, 3) if self.switches else 0.0
+            }
@@ -0,0 +1,174 @@
+# scripts/annotators.py
+import os
+import json
+import time
+import random
+import hashlib
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+GEMINI_ENDPOINT = "https://generativelanguage.googleapis.com/v1beta/models/gemini-flash-lite-latest:generateContent"
+
+# Placeholder values that mean no real key was configured
+PLACEHOLDER_KEYS = {"", "GEMINI_API_KEY", "YOUR_GEMINI_API_KEY"}
+
+
+def generate_fallback_prompt(html_code):
+    """Heuristic fallback prompt generator if the Gemini API call fails or is not configured."""
+    html_lower = html_code.lower()
+    if "data-dismiss-target" in html_lower or "close" in html_lower:
+        return "Create an interactive dismissible status alert component with a close button using HTML and Tailwind CSS."
+    elif "svg" in html_lower:
+        return "Design a modern status alert component featuring a warning or info icon using HTML and Tailwind CSS."
+    elif "border" in html_lower:
+        return "Design a set of responsive bordered status alerts (info, warning, danger, success) using HTML and Tailwind CSS."
+    elif "list" in html_lower or "<ul" in html_lower:
+        return "Design a detailed responsive list-style status alert layout with custom bullets, styled text, and background containers using HTML and Tailwind CSS."
+    elif "additional-content" in html_lower or "read more" in html_lower:
+        return "Design a rich, multi-paragraph alert panel containing additional helper text, inline links, and action buttons in HTML and Tailwind CSS."
+
+    return "Design a set of responsive warning, info, danger, and success alert components with rounded corners using HTML and Tailwind CSS."
+
+
+class Annotator(ABC):
+    """Turns one HTML block into the user prompt that should produce it.
+
+    `annotate` returns None when no prompt could be produced, so callers can fall back.
+    `cacheable` marks annotators whose answers are worth persisting between runs.
+    """
+
+    name = "annotator"
+    cacheable = False
+
+    @abstractmethod
+    def annotate(self, html_code):
+        """Returns the user prompt for `html_code`, or None."""
+
+
+class FallbackAnnotator(Annotator):
+    """Offline annotator built on the `generate_fallback_prompt` heuristics."""
+
+    name = "fallback"
+
+    def annotate(self, html_code):
+        return generate_fallback_prompt(html_code)
+
+
+class GeminiAnnotator(Annotator):
+    """Gemini `generateContent` annotator with retries and exponential backoff.
+
+    `endpoint` can point at a local stub server that answers with the same JSON shape, which
+    keeps tests and offline runs away from the real API.
+    """
+
+    name = "gemini"
+    cacheable = True
+
+    def __init__(self, api_key=None, endpoint=GEMINI_ENDPOINT, timeout=12, retries=3, backoff=1.0, pool_size=8):
+        self.api_key = api_key
+        self.endpoint = endpoint
+        # Stub-server answers must never be served from the cache as real Gemini annotations
+        self.name = "gemini" if endpoint == GEMINI_ENDPOINT else f"gemini@{endpoint}"
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def payload(self, html_code):
+        prompt_instruction = (
+            "You are an expert annotation assistant building a fine-tuning dataset for an HTML generation model. "
+            "Review the HTML code provided below, which contains styled status alert elements using Tailwind CSS. "
+            "Your task is to draft a natural, direct, and concise request (1 to 2 sentences) that a developer would write to get this exact output. "
+            "Highlight specific layout characteristics, custom styles (like colored borders, brand-colored backgrounds, soft alert elements), "
+            "and details such as icons, dismissible close buttons, bullet lists, or inline action elements. "
+            "Strictly return ONLY the plain text prompt. Do not write any preambles, markdown formatting, or quotes around the prompt.\n\n"
+            f"HTML snippet to convert into a user prompt:\n```html\n{html_code}\n```"
+        )
+        return {"contents": [{"parts": [{"text": prompt_instruction}]}]}
+
+    def annotate(self, html_code):
+        params = {"key": self.api_key} if self.api_key else None
+        for attempt in range(self.retries + 1):
+            try:
+                response = self.session.post(self.endpoint, params=params, json=self.payload(html_code), timeout=self.timeout)
+                if response.status_code == 200:
+                    return response.json()["candidates"][0]["content"]["parts"][0]["text"].strip()
+                # Only rate limits and server errors are worth retrying
+                if response.status_code != 429 and response.status_code < 500:
+                    print(f"Gemini API Error [{response.status_code}]: {response.text[:200]}")
+                    return None
+                error = f"HTTP {response.status_code}"
+            except (requests.RequestException, KeyError, IndexError, ValueError) as e:
+                error = str(e)
+
+            if attempt < self.retries:
+                # Exponential backoff with jitter so concurrent workers do not retry in lockstep
+                time.sleep(self.backoff * (2 ** attempt) * (0.5 + random.random()))
+        print(f"Failed to communicate with Gemini API after {self.retries + 1} attempts: {error}")
+        return None
+
+
+class AnnotationCache:
+    """Append-only JSONL cache of annotations keyed by annotator name and HTML content hash."""
+
+    def __init__(self, path="data/annotation_cache.jsonl"):
+        self.path = path
+        self.entries = {}
+        self.lock = threading.Lock()
+
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # A line cut off by an interrupted run
+                    self.entries[(entry["annotator"], entry["hash"])] = entry["prompt"]
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    @staticmethod
+    def content_hash(html_code):
+        return hashlib.sha256(html_code.encode("utf-8")).hexdigest()
+
+    def get(self, annotator, html_code):
+        with self.lock:
+            return self.entries.get((annotator.name, self.content_hash(html_code)))
+
+    def put(self, annotator, html_code, prompt):
+        entry = {"annotator": annotator.name, "hash": self.content_hash(html_code), "prompt": prompt}
+        with self.lock:
+            self.entries[(entry["annotator"], entry["hash"])] = prompt
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+
+
+def annotate_blocks(blocks, annotator, cache=None, workers=4, fallback=None):
+    """Annotates HTML blocks with at most `workers` requests in flight.
+
+    Returns one (prompt, source) tuple per block in input order, where source is "cache", the
+    annotator name or the fallback annotator name.
+    """
+    fallback = fallback or FallbackAnnotator()
+
+    def annotate_one(html_code):
+        if cache is not None and annotator.cacheable:
+            cached = cache.get(annotator, html_code)
+            if cached is not None:
+                return cached, "cache"
+
+        prompt = annotator.annotate(html_code)
+        if prompt:
+            if cache is not None and annotator.cacheable:
+                cache.put(annotator, html_code, prompt)
+            return prompt, annotator.name
+        return fallback.annotate(html_code), fallback.name
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        return list(pool.map(annotate_one, blocks))
@@ -0,0 +1,115 @@
+# scripts/batch_generate.py
+import os
+import json
+import time
+import argparse
+
+from batching import generate_padded_batch
+from devstudio_runtime import load_model, iter_prompts, render_prompt
+
+
+def load_completed(output_path):
+    """Returns the input line indices already written to `output_path`.
+
+    A line cut off by an interruption is dropped from the file, and a complete last line without
+    its newline gets one, so appending can resume cleanly.
+    """
+    if not os.path.exists(output_path):
+        return set()
+
+    completed, valid_lines, truncated, missing_newline = set(), [], False, False
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            missing_newline = not line.endswith("\n")
+            try:
+                completed.add(json.loads(line)["index"])
+                valid_lines.append(line if line.endswith("\n") else line + "\n")
+            except (json.JSONDecodeError, KeyError):
+                truncated = True
+
+    if truncated:
+        tmp_path = f"{output_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.writelines(valid_lines)
+        os.replace(tmp_path, output_path)
+    elif missing_newline:
+        with open(output_path, "a", encoding="utf-8") as f:
+            f.write("\n")
+    return completed
+
+
+def iter_windows(samples, window_size):
+    window = []
+    for sample in samples:
+        window.append(sample)
+        if len(window) >= window_size:
+            yield window
+            window = []
+    if window:
+        yield window
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate answers for a JSONL prompt set in length-bucketed padded batches")
+    parser.add_argument("--model", default="models/final_merged")
+    parser.add_argument("--quantize", choices=["int8"], help="Run on CPU with int8 Linear layers")
+    parser.add_argument("--input", default="data/validation.jsonl")
+    parser.add_argument("--output", default="outputs/batch_predictions.jsonl")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--window", type=int, default=256, help="Prompts read ahead and sorted by length before batching")
+    parser.add_argument("--max-new-tokens", type=int, default=1024)
+    parser.add_argument("--temperature", type=float, default=0.0)
+    args = parser.parse_args()
+
+    completed = load_completed(args.output)
+    if completed:
+        print(f"Resuming: {len(completed)} prompts already in '{args.output}'.")
+
+    tokenizer, model = load_model(args.model, quantize=args.quantize)
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+
+    pending = (sample for sample in iter_prompts(args.input) if sample["index"] not in completed)
+    done = generated = 0
+    start = time.perf_counter()
+
+    with open(args.output, "a", encoding="utf-8") as out:
+        for window in iter_windows(pending, args.window):
+            for sample in window:
+                sample["prompt"] = render_prompt(tokenizer, sample["messages"])
+                sample["prompt_tokens"] = len(tokenizer(sample["prompt"])["input_ids"])
+
+            # Neighbouring prompts of similar length waste little compute on padding
+            window.sort(key=lambda s: s["prompt_tokens"])
+            for offset in range(0, len(window), args.batch_size):
+                batch = window[offset:offset + args.batch_size]
+                batch_start = time.perf_counter()
+                outputs = generate_padded_batch(model, tokenizer, [s["prompt"] for s in batch], args.max_new_tokens, args.temperature)
+                batch_seconds = time.perf_counter() - batch_start
+
+                for sample, (text, tokens) in zip(batch, outputs):
+                    out.write(json.dumps({
+                        "index": sample["index"],
+                        "prompt": sample["messages"][-1]["content"],
+                        "reference": sample["reference"],
+                        "output": text,
+                        "prompt_tokens": sample["prompt_tokens"],
+                        "generated_tokens": tokens
+                    }) + "\n")
+                # Flush per batch so an interruption loses at most the batch in flight
+                out.flush()
+
+                done += len(batch)
+                generated += sum(tokens for _, tokens in outputs)
+                elapsed = time.perf_counter() - start
+                print(
+                    f"[{len(completed) + done}] batch of {len(batch)} in {batch_seconds:.2f}s | "
+                    f"{done / elapsed:.2f} prompts/sec | {generated / elapsed:.1f} tokens/sec"
+                )
+
+    elapsed = time.perf_counter() - start
+    print(f"\nGenerated {done} answers in {elapsed:.1f}s ({done / elapsed if elapsed else 0:.2f} prompts/sec).")
+    print(f"Results saved to '{args.output}'.")
+
+
+if __name__ == "__main__":
+    main()
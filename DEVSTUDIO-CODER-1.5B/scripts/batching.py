@@ -0,0 +1,217 @@
+# scripts/batching.py
+import time
+import queue
+import threading
+from collections import deque
+from contextlib import nullcontext
+from concurrent.futures import Future
+
+import torch
+from transformers.generation.streamers import BaseStreamer
+
+from transformers import StoppingCriteriaList
+
+from devstudio_runtime import render_prompt, HtmlCompletionCriteria
+
+
+class FirstTokenTimer(BaseStreamer):
+    """Records when the first generated token of a (batched) generate call is produced."""
+
+    def __init__(self):
+        self.prompt_seen = False
+        self.first_token_time = None
+
+    def put(self, value):
+        if not self.prompt_seen:
+            self.prompt_seen = True
+        elif self.first_token_time is None:
+            self.first_token_time = time.perf_counter()
+
+    def end(self):
+        pass
+
+
+def generate_padded_batch(model, tokenizer, prompts, max_new_tokens=1024, temperature=0.2, timer=None, stop_at_document_end=True):
+    """Generates completions for several rendered prompts in one left-padded `model.generate` call.
+
+    Returns one (text, generated_token_count) tuple per prompt, in input order. With
+    `stop_at_document_end`, the batch finishes once every row has completed its HTML answer.
+    """
+    # Decoder-only models must be left padded so every row continues from its last real token
+    tokenizer.padding_side = "left"
+    pad_token_id = tokenizer.pad_token_id if tokenizer.pad_token_id is not None else tokenizer.eos_token_id
+    inputs = tokenizer(prompts, return_tensors="pt", padding=True).to(model.device)
+
+    generation_kwargs = dict(
+        **inputs,
+        max_new_tokens=max_new_tokens,
+        eos_token_id=tokenizer.eos_token_id,
+        pad_token_id=pad_token_id,
+        streamer=timer
+    )
+    if stop_at_document_end:
+        generation_kwargs["stopping_criteria"] = StoppingCriteriaList([HtmlCompletionCriteria(tokenizer, inputs["input_ids"].shape[1])])
+    if temperature and temperature > 0:
+        generation_kwargs.update(do_sample=True, temperature=temperature)
+    else:
+        generation_kwargs.update(do_sample=False)
+
+    with torch.no_grad():
+        outputs = model.generate(**generation_kwargs)
+
+    results = []
+    for row in outputs[:, inputs["input_ids"].shape[1]:].tolist():
+        # Finished rows are padded up to the longest one, so count only up to the first EOS
+        if tokenizer.eos_token_id in row:
+            length = row.index(tokenizer.eos_token_id) + 1
+        else:
+            length = len(row)
+            while length and row[length - 1] == pad_token_id:
+                length -= 1
+        results.append((tokenizer.decode(row[:length], skip_special_tokens=True), length))
+    return results
+
+
+class PendingRequest:
+    def __init__(self, messages, max_new_tokens, temperature, prompt, adapter=None):
+        self.messages = messages
+        self.max_new_tokens = max_new_tokens
+        self.temperature = temperature
+        self.prompt = prompt
+        self.adapter = adapter
+        self.prompt_tokens = 0
+        self.enqueued_at = time.perf_counter()
+        self.future = Future()
+
+
+class BatchScheduler:
+    """Gathers concurrent prompts for a short window and runs them as padded batches.
+
+    Requests are grouped by prompt length bucket, `max_new_tokens` and temperature so rows in
+    one batch need similar padding and stop at the same budget. Results are routed back to the
+    caller through a Future per request.
+    """
+
+    def __init__(self, model, tokenizer, lock, window_ms=20, max_batch_size=8, length_bucket=64, adapters=None):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.lock = lock
+        self.adapters = adapters
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max_batch_size
+        self.length_bucket = length_bucket
+        self.queue = queue.Queue()
+
+        self.metrics_lock = threading.Lock()
+        self.total_requests = 0
+        self.total_batches = 0
+        self.batch_size_counts = {}
+        self.queue_waits = deque(maxlen=1000)
+
+        self.worker = threading.Thread(target=self.run, daemon=True)
+        self.worker.start()
+
+    def submit(self, messages, max_new_tokens=1024, temperature=0.2, adapter=None):
+        prompt = render_prompt(self.tokenizer, messages)
+        request = PendingRequest(messages, max_new_tokens, temperature, prompt, adapter)
+        self.queue.put(request)
+        return request.future
+
+    def collect(self):
+        # Block for the first request, then keep gathering until the window closes or the batch is full
+        pending = [self.queue.get()]
+        deadline = time.perf_counter() + self.window
+        while len(pending) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                pending.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return pending
+
+    def group(self, pending):
+        groups = {}
+        for request in pending:
+            # Rows of one batch share the model weights, so they must also share the active adapter
+            key = (request.prompt_tokens // self.length_bucket, request.max_new_tokens, request.temperature, request.adapter)
+            groups.setdefault(key, []).append(request)
+        return list(groups.values())
+
+    def run(self):
+        while True:
+            pending = self.collect()
+
+            # Fast tokenizers are not safe to call from several threads, so tokenize under the model lock
+            ready = []
+            with self.lock:
+                for request in pending:
+                    try:
+                        request.prompt_tokens = len(self.tokenizer(request.prompt)["input_ids"])
+                        ready.append(request)
+                    except Exception as e:
+                        request.future.set_exception(e)
+
+            for batch in self.group(ready):
+                self.run_batch(batch)
+
+    def run_batch(self, batch):
+        timer = FirstTokenTimer()
+        try:
+            with self.lock, (self.adapters.use(batch[0].adapter) if self.adapters is not None else nullcontext()):
+                started_at = time.perf_counter()
+                outputs = generate_padded_batch(
+                    self.model,
+                    self.tokenizer,
+                    [request.prompt for request in batch],
+                    max_new_tokens=batch[0].max_new_tokens,
+                    temperature=batch[0].temperature,
+                    timer=timer
+                )
+                finished_at = time.perf_counter()
+        except Exception as e:
+            for request in batch:
+                request.future.set_exception(e)
+            return
+
+        first_token_time = timer.first_token_time or finished_at
+        decode_time = finished_at - first_token_time
+        waits = [started_at - request.enqueued_at for request in batch]
+        self.record(len(batch), waits)
+
+        for request, wait, (text, generated_tokens) in zip(batch, waits, outputs):
+            request.future.set_result((text, {
+                "prompt_tokens": request.prompt_tokens,
+                "generated_tokens": generated_tokens,
+                "ttft_seconds": round(first_token_time - request.enqueued_at, 4),
+                "total_seconds": round(finished_at - request.enqueued_at, 4),
+                "tokens_per_second": round((generated_tokens - 1) / decode_time, 2) if generated_tokens > 1 and decode_time > 0 else 0.0,
+                "queue_wait_seconds": round(wait, 4),
+                "batch_size": len(batch)
+            }))
+
+    def record(self, batch_size, waits):
+        with self.metrics_lock:
+            self.total_requests += batch_size
+            self.total_batches += 1
+            self.batch_size_counts[batch_size] = self.batch_size_counts.get(batch_size, 0) + 1
+            self.queue_waits.extend(waits)
+
+    def metrics(self):
+        with self.metrics_lock:
+            waits = sorted(self.queue_waits)
+            return {
+                "requests": self.total_requests,
+                "batches": self.total_batches,
+                "mean_batch_size": round(self.total_requests / self.total_batches, 2) if self.total_batches else 0.0,
+                "batch_size_counts": dict(sorted(self.batch_size_counts.items())),
+                "queued": self.queue.qsize(),
+                # Queue-wait percentiles over the most recent requests
+                "queue_wait_seconds": {
+                    "mean": round(sum(waits) / len(waits), 4) if waits else 0.0,
+                    "p50": round(waits[len(waits) // 2], 4) if waits else 0.0,
+                    "p95": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 4) if waits else 0.0,
+                    "max": round(waits[-1], 4) if waits else 0.0
+                }
+            }
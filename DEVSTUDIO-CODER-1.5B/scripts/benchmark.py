@@ -0,0 +1,201 @@
+# scripts/benchmark.py
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+
+from adapters import find_adapters, has_weights
+
+# Model variants compared by default, mirroring the layout described in README.md
+BASE_MODEL = "models/base"
+MERGED_MODEL = "models/final_merged"
+
+# Metrics where a higher value is a regression; tokens/sec is the only higher-is-better metric
+LOWER_IS_BETTER = ["load_seconds", "ttft_seconds", "peak_rss_mb"]
+
+
+def discover_variants(names):
+    """Expands variant names into (name, model path, adapter path) triples, skipping ones without weights."""
+    variants = []
+    for name in names:
+        if name == "base":
+            candidates = [("base", BASE_MODEL, None)]
+        elif name == "merged":
+            candidates = [("merged", MERGED_MODEL, None)]
+        elif name == "adapters":
+            candidates = [(name, BASE_MODEL, path) for name, path in find_adapters().items()]
+        else:
+            sys.exit(f"Error: unknown variant '{name}' (expected base, adapters or merged).")
+
+        for variant, model_path, adapter_path in candidates:
+            if not has_weights(model_path):
+                print(f"Skipping '{variant}': no weights found.")
+                continue
+            variants.append((variant, model_path, adapter_path))
+    return variants
+
+
+def run_worker(config, val_file, limit, max_new_tokens):
+    """Measures one (variant, dtype, threads) configuration across batch sizes in this process."""
+    import torch
+    from batching import FirstTokenTimer, generate_padded_batch
+    from devstudio_runtime import load_model, load_prompts, render_prompt, peak_rss_mb
+
+    torch.set_num_threads(config["threads"])
+    quantize = "int8" if config["dtype"] == "int8" else None
+    dtype = None if quantize else getattr(torch, config["dtype"])
+
+    start = time.perf_counter()
+    tokenizer, model = load_model(config["model_path"], quantize=quantize, device=config["device"], dtype=dtype)
+    if config["adapter_path"]:
+        from peft import PeftModel
+        model = PeftModel.from_pretrained(model, config["adapter_path"])
+        model.eval()
+    load_seconds = time.perf_counter() - start
+
+    prompts = [render_prompt(tokenizer, sample["messages"]) for sample in load_prompts(val_file, limit)]
+
+    results = []
+    for batch_size in config["batch_sizes"]:
+        ttfts, seconds, generated, lengths = [], 0.0, 0, []
+        for offset in range(0, len(prompts), batch_size):
+            timer = FirstTokenTimer()
+            start = time.perf_counter()
+            outputs = generate_padded_batch(model, tokenizer, prompts[offset:offset + batch_size], max_new_tokens, temperature=0, timer=timer)
+            end = time.perf_counter()
+
+            ttfts.append((timer.first_token_time or end) - start)
+            seconds += end - start
+            generated += sum(tokens for _, tokens in outputs)
+            lengths.extend(tokens for _, tokens in outputs)
+
+        results.append({
+            "variant": config["variant"],
+            "dtype": config["dtype"],
+            "threads": config["threads"],
+            "batch_size": batch_size,
+            "load_seconds": round(load_seconds, 3),
+            "cold_start": getattr(model, "cold_start", {}),
+            "ttft_seconds": round(sum(ttfts) / len(ttfts), 4) if ttfts else 0.0,
+            "tokens_per_second": round(generated / seconds, 2) if seconds else 0.0,
+            # Peak RSS is process-wide, so it includes every smaller batch measured before this one
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+            "mean_output_tokens": round(sum(lengths) / len(lengths), 1) if lengths else 0.0,
+            "prompts": len(prompts)
+        })
+    print(json.dumps(results))
+
+
+def find_regressions(results, baseline, threshold):
+    key = lambda r: (r["variant"], r["dtype"], r["threads"], r["batch_size"])
+    previous = {key(r): r for r in baseline.get("results", [])}
+
+    regressions = []
+    for result in results:
+        old = previous.get(key(result))
+        if old is None:
+            continue
+        for metric in LOWER_IS_BETTER:
+            if old.get(metric) and result[metric] > old[metric] * (1 + threshold):
+                regressions.append(f"{key(result)} {metric}: {old[metric]} -> {result[metric]}")
+        if old.get("tokens_per_second") and result["tokens_per_second"] < old["tokens_per_second"] * (1 - threshold):
+            regressions.append(f"{key(result)} tokens_per_second: {old['tokens_per_second']} -> {result['tokens_per_second']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark inference across the base model, LoRA adapters and the merged model")
+    parser.add_argument("--variants", default="base,adapters,merged", help="Comma-separated subset of base, adapters, merged")
+    parser.add_argument("--dtypes", default="float32", help="Comma-separated torch dtypes (float32, bfloat16, float16) or int8")
+    parser.add_argument("--threads", default=str(os.cpu_count() or 1), help="Comma-separated torch thread counts")
+    parser.add_argument("--batch-sizes", default="1", help="Comma-separated batch sizes")
+    parser.add_argument("--device", help="Force a device (defaults to cuda when available)")
+    parser.add_argument("--val-file", default="data/validation.jsonl")
+    parser.add_argument("--limit", type=int, default=4, help="Number of validation prompts per configuration")
+    parser.add_argument("--max-new-tokens", type=int, default=256)
+    parser.add_argument("--output", default="outputs/benchmark_results.json")
+    parser.add_argument("--baseline", help="Previous results file to check for regressions")
+    parser.add_argument("--max-regression", type=float, default=0.15, help="Allowed relative slowdown before failing")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(json.loads(args.worker), args.val_file, args.limit, args.max_new_tokens)
+        return
+
+    variants = discover_variants(args.variants.split(","))
+    dtypes = args.dtypes.split(",")
+    threads = [int(t) for t in args.threads.split(",")]
+    batch_sizes = [int(b) for b in args.batch_sizes.split(",")]
+
+    results, failures = [], []
+    for variant, model_path, adapter_path in variants:
+        for dtype in dtypes:
+            for thread_count in threads:
+                config = {
+                    "variant": variant,
+                    "model_path": model_path,
+                    "adapter_path": adapter_path,
+                    "device": args.device,
+                    "dtype": dtype,
+                    "threads": thread_count,
+                    "batch_sizes": batch_sizes
+                }
+                print(f"\n--- {variant} | {dtype} | {thread_count} threads | batch sizes {batch_sizes} ---")
+
+                # A fresh process per configuration keeps load time and peak RSS independent
+                command = [
+                    sys.executable, os.path.abspath(__file__),
+                    "--worker", json.dumps(config),
+                    "--val-file", args.val_file,
+                    "--limit", str(args.limit),
+                    "--max-new-tokens", str(args.max_new_tokens)
+                ]
+                completed = subprocess.run(command, capture_output=True, text=True)
+                if completed.returncode != 0:
+                    print(completed.stderr[-2000:])
+                    failures.append(f"{variant} | {dtype} | {thread_count} threads")
+                    continue
+
+                for result in json.loads(completed.stdout.strip().splitlines()[-1]):
+                    results.append(result)
+                    print(
+                        f"batch {result['batch_size']}: load {result['load_seconds']}s | TTFT {result['ttft_seconds']}s | "
+                        f"{result['tokens_per_second']} tokens/sec | peak RSS {result['peak_rss_mb']} MB | "
+                        f"{result['mean_output_tokens']} tokens/output"
+                    )
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "val_file": args.val_file,
+            "prompts": args.limit,
+            "max_new_tokens": args.max_new_tokens
+        },
+        "results": results,
+        "failures": failures
+    }
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults saved to '{args.output}'.")
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = find_regressions(results, json.load(f), args.max_regression)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+
+    if failures or regressions:
+        sys.exit(1)
+    print("No regressions detected." if args.baseline else "Pass --baseline to check for regressions.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+# scripts/crawler.py
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+}
+
+
+class HostRateLimiter:
+    """Spaces out requests to the same host so concurrent workers never exceed `rate` requests/sec."""
+
+    def __init__(self, rate=2.0):
+        self.interval = 1.0 / rate if rate and rate > 0 else 0.0
+        self.next_slot = {}
+        self.lock = threading.Lock()
+
+    def wait(self, url):
+        host = urlparse(url).netloc
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot.get(host, now))
+            self.next_slot[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class HttpCache:
+    """On-disk cache of page bodies revalidated with ETag / Last-Modified conditional requests."""
+
+    def __init__(self, cache_dir="data/http_cache"):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def paths(self, url):
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.json"), os.path.join(self.cache_dir, f"{key}.html")
+
+    def load(self, url):
+        meta_path, body_path = self.paths(url)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            with open(body_path, "r", encoding="utf-8") as f:
+                return meta, f.read()
+        except (OSError, json.JSONDecodeError):
+            return None, None
+
+    def validators(self, meta):
+        headers = {}
+        if meta and meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta and meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        return headers
+
+    def store(self, url, response):
+        meta_path, body_path = self.paths(url)
+        # Body first and metadata last, so a crash never leaves metadata pointing at a missing body
+        for path, content in [
+            (body_path, response.text),
+            (meta_path, json.dumps({
+                "url": url,
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified")
+            }))
+        ]:
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+
+
+class Crawler:
+    """Fetches documentation pages concurrently over one pooled session.
+
+    Each request waits for its host's rate limit, and pages already in the HTTP cache are
+    revalidated with a conditional GET, so unchanged pages cost a 304 instead of a full download.
+    """
+
+    def __init__(self, workers=8, rate=2.0, cache_dir="data/http_cache", timeout=20):
+        self.workers = workers
+        self.timeout = timeout
+        self.limiter = HostRateLimiter(rate)
+        self.cache = HttpCache(cache_dir) if cache_dir else None
+        self.session = requests.Session()
+        self.session.headers.update(DEFAULT_HEADERS)
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.counts = {"fetched": 0, "not_modified": 0, "failed": 0}
+        self.counts_lock = threading.Lock()
+
+    def count(self, key):
+        with self.counts_lock:
+            self.counts[key] += 1
+
+    def fetch(self, url):
+        """Returns the page body, falling back to a stale cached copy when the request itself fails."""
+        meta, cached_body = self.cache.load(url) if self.cache else (None, None)
+        headers = self.cache.validators(meta) if cached_body is not None else {}
+
+        self.limiter.wait(url)
+        try:
+            response = self.session.get(url, headers=headers, timeout=self.timeout)
+        except requests.RequestException as e:
+            print(f"Could not reach {url}: {e}")
+            self.count("failed")
+            return cached_body
+
+        if response.status_code == 304 and cached_body is not None:
+            self.count("not_modified")
+            return cached_body
+        if response.status_code != 200:
+            print(f"Could not reach {url}. HTTP Status: {response.status_code}")
+            self.count("failed")
+            return None
+
+        if self.cache:
+            self.cache.store(url, response)
+        self.count("fetched")
+        return response.text
+
+    def fetch_all(self, urls):
+        """Yields (url, body) pairs in input order while later pages are still downloading."""
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            yield from zip(urls, pool.map(self.fetch, urls))
+
+    def sitemap_urls(self, sitemap_url, prefix=""):
+        body = self.fetch(sitemap_url) or ""
+        return [url for url in re.findall(r"<loc>\s*([^<\s]+)\s*</loc>", body) if url.startswith(prefix)]
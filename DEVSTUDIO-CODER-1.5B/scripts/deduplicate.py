@@ -0,0 +1,226 @@
+# scripts/deduplicate.py
+import os
+import re
+import json
+import hashlib
+import argparse
+from array import array
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+|[^\sa-z0-9]")
+EMPTY_BIN = 2**64 - 1  # Largest 64-bit value, so any real shingle hash replaces it
+
+
+def normalize(text):
+    return " ".join(text.split())
+
+
+def record_key(record):
+    """Stable hash of a conversation's user/assistant turns, ignoring whitespace and the system prompt."""
+    turns = [[m["role"], normalize(m["content"])] for m in record["messages"] if m["role"] != "system"]
+    return hashlib.sha256(json.dumps(turns).encode("utf-8")).hexdigest()
+
+
+def answer_key(record):
+    """Stable hash of the assistant turns only, for samples whose prompts are regenerated between runs."""
+    answers = [normalize(m["content"]) for m in record["messages"] if m["role"] == "assistant"]
+    return hashlib.sha256(json.dumps(answers).encode("utf-8")).hexdigest()
+
+
+def iter_records(path):
+    """Yields (line_number, raw_line, record) for every parseable line of a JSONL file."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield line_number, line, json.loads(line)
+            except json.JSONDecodeError:
+                continue  # A line cut off by an interrupted writer
+
+
+def read_keys(path, key=record_key):
+    """Returns the keys of every record already in `path`, so appenders can skip what is there."""
+    if not os.path.exists(path):
+        return set()
+    return {key(record) for _, _, record in iter_records(path)}
+
+
+def shingle_text(record):
+    """Assistant content reduced to what differs between samples.
+
+    Scraped samples share the same CDN/Tailwind wrapper, which would make every page look alike,
+    so only the <body> of an HTML answer is shingled.
+    """
+    text = "\n".join(m["content"] for m in record["messages"] if m["role"] == "assistant").lower()
+    body = re.search(r"<body[^>]*>(.*)</body>", text, re.DOTALL)
+    return body.group(1) if body else text
+
+
+def shingles(text, size=5):
+    tokens = TOKEN_PATTERN.findall(text)
+    if len(tokens) <= size:
+        return {" ".join(tokens)}
+    return {" ".join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)}
+
+
+def minhash(shingle_set, num_perm=128):
+    """One-permutation MinHash: every shingle is hashed once and kept as the minimum of its bin.
+
+    This costs O(shingles) per sample instead of O(shingles * num_perm) for classic MinHash, and
+    bins left empty (short samples) are marked with EMPTY_BIN. The signature is a packed array of
+    unsigned 64-bit ints (8 bytes per bin), so large datasets keep their signatures in memory cheaply.
+    """
+    signature = array("Q", [EMPTY_BIN]) * num_perm
+    for shingle in shingle_set:
+        h = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "little")
+        slot = h % num_perm
+        if h < signature[slot]:
+            signature[slot] = h
+    return signature
+
+
+def similarity(a, b):
+    """Estimated Jaccard similarity over the bins that are filled in at least one signature."""
+    filled = [(x, y) for x, y in zip(a, b) if x != EMPTY_BIN or y != EMPTY_BIN]
+    return sum(x == y for x, y in filled) / len(filled) if filled else 1.0
+
+
+class UnionFind:
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, item):
+        self.parent.setdefault(item, item)
+        while self.parent[item] != item:
+            self.parent[item] = self.parent[self.parent[item]]
+            item = self.parent[item]
+        return item
+
+    def union(self, a, b):
+        # The earlier sample always becomes the root, so it is the one kept from each cluster
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a != root_b:
+            self.parent[max(root_a, root_b)] = min(root_a, root_b)
+
+
+def near_duplicate_clusters(signatures, bands=16, threshold=0.85):
+    """Groups near-duplicate samples with LSH banding over their MinHash signatures.
+
+    Only samples sharing a band are compared, so the work stays close to linear in the number of
+    samples. Within a bucket every pair not already in one cluster is verified, so two near
+    duplicates are found even when neither resembles the bucket's other members.
+    Returns {kept_line: [removed_lines]}.
+    """
+    num_perm = len(next(iter(signatures.values()), []))
+    rows = max(1, num_perm // bands)
+    empty_chunk = array("Q", [EMPTY_BIN] * rows).tobytes()
+    clusters = UnionFind()
+
+    for band in range(0, rows * bands, rows):
+        buckets = {}
+        for line_number, signature in signatures.items():
+            chunk = signature[band:band + rows].tobytes()
+            if chunk == empty_chunk:
+                continue  # Empty bands of short samples would otherwise all collide
+            buckets.setdefault(chunk, []).append(line_number)
+
+        for members in buckets.values():
+            for i, first in enumerate(members):
+                for other in members[i + 1:]:
+                    if clusters.find(first) != clusters.find(other) and similarity(signatures[first], signatures[other]) >= threshold:
+                        clusters.union(first, other)
+
+    groups = {}
+    for line_number in signatures:
+        root = clusters.find(line_number)
+        if root != line_number:
+            groups.setdefault(root, []).append(line_number)
+    return groups
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Remove exact and near-duplicate samples from a chat JSONL dataset")
+    parser.add_argument("--input", default="data/train.jsonl")
+    parser.add_argument("--output", help="Deduplicated JSONL file (defaults to rewriting --input in place)")
+    parser.add_argument("--threshold", type=float, default=0.85, help="Estimated Jaccard similarity above which samples are near-duplicates")
+    parser.add_argument("--num-perm", type=int, default=128, help="MinHash signature size")
+    parser.add_argument("--bands", type=int, default=16, help="LSH bands (num-perm / bands rows each)")
+    parser.add_argument("--shingle-size", type=int, default=5, help="Tokens per shingle of the assistant HTML")
+    parser.add_argument("--report", default="outputs/dedup_report.json")
+    parser.add_argument("--dry-run", action="store_true", help="Only write the report")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.input):
+        print(f"Error: Dataset file '{args.input}' not found. Make sure you have populated data first.")
+        return
+    output = args.output or args.input
+
+    # 1. Exact duplicates: the first occurrence of every conversation hash wins
+    print(f"Reading dataset from: {args.input}")
+    seen = {}
+    exact = {}
+    signatures = {}
+    previews = {}
+    total = 0
+    for line_number, _, record in iter_records(args.input):
+        total += 1
+        key = record_key(record)
+        if key in seen:
+            exact.setdefault(seen[key], []).append(line_number)
+            continue
+        seen[key] = line_number
+        # 2. MinHash signatures of the remaining samples' assistant content
+        signatures[line_number] = minhash(shingles(shingle_text(record), args.shingle_size), args.num_perm)
+        previews[line_number] = next((m["content"][:80] for m in record["messages"] if m["role"] == "user"), "")
+
+    # 3. Near duplicates: LSH candidates verified against the similarity threshold
+    near = near_duplicate_clusters(signatures, args.bands, args.threshold)
+    removed = {line for lines in exact.values() for line in lines} | {line for lines in near.values() for line in lines}
+
+    report = {
+        "input": args.input,
+        "output": None if args.dry_run else output,
+        "samples": total,
+        "kept": total - len(removed),
+        "exact_duplicates_removed": sum(len(lines) for lines in exact.values()),
+        "near_duplicates_removed": sum(len(lines) for lines in near.values()),
+        "settings": {"threshold": args.threshold, "num_perm": args.num_perm, "bands": args.bands, "shingle_size": args.shingle_size},
+        # Line numbers are 0-based positions in the input file
+        "near_duplicate_clusters": [
+            {
+                "kept": kept,
+                "removed": lines,
+                "kept_prompt": previews[kept],
+                "similarity": [round(similarity(signatures[kept], signatures[line]), 4) for line in lines]
+            }
+            for kept, lines in sorted(near.items())
+        ]
+    }
+
+    # 4. Stream the survivors out, writing to a temporary file so the input is replaced atomically
+    if not args.dry_run:
+        os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+        tmp_path = f"{output}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for line_number, line, _ in iter_records(args.input):
+                if line_number not in removed:
+                    f.write(line + "\n")
+        os.replace(tmp_path, output)
+
+    os.makedirs(os.path.dirname(args.report) or ".", exist_ok=True)
+    with open(args.report, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    print("\n--- Deduplication Complete ---")
+    print(f"Total Source Records Processed: {total}")
+    print(f"Exact duplicates removed: {report['exact_duplicates_removed']}")
+    print(f"Near duplicates removed: {report['near_duplicates_removed']} across {len(near)} clusters (similarity >= {args.threshold})")
+    if args.dry_run:
+        print(f"Dry run: {report['kept']} records would be kept. Report saved to '{args.report}'.")
+    else:
+        print(f"Saved {report['kept']} records to '{output}'. Report saved to '{args.report}'.")
+
+
+if __name__ == "__main__":
+    main()
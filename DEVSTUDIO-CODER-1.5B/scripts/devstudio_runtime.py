@@ -0,0 +1,466 @@
+# scripts/devstudio_runtime.py
+import os
+import sys
+import copy
+import json
+import time
+import threading
+import torch
+from transformers import AutoConfig, AutoTokenizer, AutoModelForCausalLM, GenerationConfig, TextIteratorStreamer, StoppingCriteria, StoppingCriteriaList, DynamicCache
+try:
+    from transformers.initialization import no_init_weights  # transformers 5.x
+except ImportError:
+    from transformers.modeling_utils import no_init_weights
+from safetensors import safe_open
+
+# Must match the system prompt used in scripts/load_initial_data.py
+SYSTEM_PROMPT = (
+    "You are DevStudio-1.5B, an in-editor coding assistant developed by DevStudio AI. "
+    "You are a highly specialized master of modern single-file HTML and Tailwind CSS designs. "
+    "Output fully functional HTML files with integrated Tailwind CSS via CDN, and provide "
+    "zero extra explanation outside the code blocks."
+)
+
+
+def select_device_and_dtype(device=None):
+    """Picks the device (unless one is forced) and the fastest stable data type for it."""
+    device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+
+    if device == "cuda":
+        # Use FP16/BF16 on GPU to save memory and increase generation speed
+        dtype = torch.bfloat16 if torch.cuda.is_bf16_supported() else torch.float16
+    else:
+        # Standard FP32 is the most stable and compatible datatype for general CPUs
+        dtype = torch.float32
+
+    return device, dtype
+
+
+# File name of a saved int8 model inside a quantized model directory (see scripts/quantize_cpu.py)
+QUANTIZED_WEIGHTS_NAME = "quantized_int8.pt"
+
+
+def quantize_for_cpu(model):
+    """Swaps every nn.Linear for an int8 dynamically quantized one.
+
+    Weights are stored as int8 and activations are quantized on the fly, which cuts the
+    memory and bandwidth of the FP32 CPU path by roughly 4x for the Linear layers.
+    """
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+# Shard size used when saving models, so each shard can be memory-mapped and loaded independently
+SHARD_SIZE = "500MB"
+
+
+def safetensors_shards(model_path):
+    """Returns the safetensors files of a saved model, or an empty list if it was saved as .bin."""
+    index_path = os.path.join(model_path, "model.safetensors.index.json")
+    if os.path.exists(index_path):
+        with open(index_path, "r", encoding="utf-8") as f:
+            return [os.path.join(model_path, name) for name in sorted(set(json.load(f)["weight_map"].values()))]
+    single = os.path.join(model_path, "model.safetensors")
+    return [single] if os.path.exists(single) else []
+
+
+def load_mmap_weights(model_path, shards, device, dtype):
+    """Builds the model without initializing it and adopts the memory-mapped shard tensors directly.
+
+    `from_pretrained` initializes random weights, copies the checkpoint into them and `model.to`
+    copies everything once more. Here each tensor is read from the mmap straight onto the target
+    device, and tensors already stored in the target dtype are used without a copy on CPU.
+    """
+    config = AutoConfig.from_pretrained(model_path)
+    # Uninitialized CPU tensors are never touched before being replaced, so this allocates no real memory
+    with no_init_weights():
+        model = AutoModelForCausalLM.from_config(config, torch_dtype=dtype)
+
+    state_dict = {}
+    for shard in shards:
+        with safe_open(shard, framework="pt", device=device) as f:
+            for name in f.keys():
+                tensor = f.get_tensor(name)
+                state_dict[name] = tensor if tensor.dtype == dtype else tensor.to(dtype)
+
+    missing, unexpected = model.load_state_dict(state_dict, strict=False, assign=True)
+    # Tied embeddings are saved once; tie_weights() points the output layer back at them
+    model.tie_weights()
+    missing = [name for name in missing if not (name == "lm_head.weight" and config.tie_word_embeddings)]
+    if missing or unexpected:
+        raise ValueError(f"Checkpoint in '{model_path}' does not match the model (missing: {missing[:5]}, unexpected: {unexpected[:5]})")
+
+    # from_config only knows the model config; the sampling defaults (repetition_penalty, top_k,
+    # top_p, pad/eos tokens) live in generation_config.json, which from_pretrained also applies
+    if os.path.exists(os.path.join(model_path, "generation_config.json")):
+        model.generation_config = GenerationConfig.from_pretrained(model_path)
+
+    # Only the small non-persistent buffers (e.g. rotary frequencies) are still left to move
+    return model.to(device)
+
+
+def load_model(model_path, quantize=None, device=None, dtype=None):
+    """Loads the tokenizer and model a single time so callers can keep them resident.
+
+    `device` and `dtype` override the automatic choice. With quantize="int8" the model runs on
+    CPU with int8 Linear layers, loaded from a saved quantized artifact when `model_path`
+    contains one and quantized on the fly otherwise. The cold-start breakdown is logged and
+    kept on `model.cold_start`.
+    """
+    if not os.path.exists(model_path) or not os.listdir(model_path):
+        raise FileNotFoundError(f"Model directory '{model_path}' is empty or not found.")
+    if quantize not in (None, "int8"):
+        raise ValueError(f"Unsupported quantization mode '{quantize}'")
+
+    if quantize == "int8":
+        return load_quantized_model(model_path)
+
+    device, default_dtype = select_device_and_dtype(device)
+    dtype = dtype or default_dtype
+    print(f"Loading DevStudio-1.5B from '{model_path}' on {device} ({dtype})...")
+
+    start = time.perf_counter()
+    tokenizer = AutoTokenizer.from_pretrained(model_path)
+    tokenizer_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    shards = safetensors_shards(model_path)
+    if shards:
+        model = load_mmap_weights(model_path, shards, device, dtype)
+    else:
+        # Load model (without device_map to bypass 'accelerate' package requirements)
+        model = AutoModelForCausalLM.from_pretrained(
+            model_path,
+            torch_dtype=dtype
+        )
+        model.to(device)
+    model.eval()
+    weights_seconds = time.perf_counter() - start
+
+    record_cold_start(tokenizer, model, tokenizer_seconds, weights_seconds)
+    return tokenizer, model
+
+
+def load_quantized_model(model_path):
+    start = time.perf_counter()
+    tokenizer = AutoTokenizer.from_pretrained(model_path)
+    tokenizer_seconds = time.perf_counter() - start
+    quantized_weights = os.path.join(model_path, QUANTIZED_WEIGHTS_NAME)
+
+    start = time.perf_counter()
+    if os.path.exists(quantized_weights):
+        print(f"Loading int8 DevStudio-1.5B from '{quantized_weights}' on cpu...")
+        # The artifact is a pickled module written locally by scripts/quantize_cpu.py
+        model = torch.load(quantized_weights, map_location="cpu", weights_only=False)
+    else:
+        print(f"Loading DevStudio-1.5B from '{model_path}' and quantizing Linear layers to int8 on cpu...")
+        model = AutoModelForCausalLM.from_pretrained(model_path, torch_dtype=torch.float32)
+        model = quantize_for_cpu(model)
+
+    model.eval()
+    weights_seconds = time.perf_counter() - start
+
+    record_cold_start(tokenizer, model, tokenizer_seconds, weights_seconds)
+    return tokenizer, model
+
+
+def record_cold_start(tokenizer, model, tokenizer_seconds, weights_seconds):
+    # The first forward pays for lazy kernel setup, so it is timed separately and kept off the first request
+    inputs = tokenizer("<!DOCTYPE html>", return_tensors="pt").to(model.device)
+    start = time.perf_counter()
+    with torch.no_grad():
+        model(**inputs)
+    first_forward_seconds = time.perf_counter() - start
+
+    model.cold_start = {
+        "tokenizer_seconds": round(tokenizer_seconds, 3),
+        "weights_seconds": round(weights_seconds, 3),
+        "first_forward_seconds": round(first_forward_seconds, 3)
+    }
+    print(
+        f"Cold start: tokenizer {tokenizer_seconds:.2f}s | weights {weights_seconds:.2f}s | "
+        f"first forward {first_forward_seconds:.2f}s"
+    )
+
+
+def current_rss_mb():
+    """Resident set size of this process in MB (falls back to the peak where /proc is unavailable)."""
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return peak_rss_mb()
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB, or None where it cannot be measured."""
+    try:
+        import resource  # Unix only
+    except ImportError:
+        try:
+            import psutil
+        except ImportError:
+            return None
+        memory = psutil.Process().memory_info()
+        # Windows reports the peak working set; elsewhere only the current RSS is available
+        return getattr(memory, "peak_wset", memory.rss) / (1024 * 1024)
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def iter_prompts(path):
+    """Streams chat samples from a JSONL dataset, dropping the assistant turn.
+
+    Yields dicts with the 0-based line `index`, the prompt `messages` and the `reference`
+    assistant answer, without reading the whole file into memory.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        for index, line in enumerate(f):
+            if not line.strip():
+                continue
+            messages = json.loads(line)["messages"]
+            yield {
+                "index": index,
+                "messages": [m for m in messages if m["role"] != "assistant"],
+                "reference": next((m["content"] for m in messages if m["role"] == "assistant"), "")
+            }
+
+
+def load_prompts(path, limit=None):
+    """Reads up to `limit` samples from `iter_prompts` into a list."""
+    samples = []
+    for sample in iter_prompts(path):
+        samples.append(sample)
+        if limit and len(samples) >= limit:
+            break
+    return samples
+
+
+def build_messages(messages):
+    """Prepends the DevStudio system prompt unless the caller already supplied one."""
+    if messages and messages[0].get("role") == "system":
+        return list(messages)
+    return [{"role": "system", "content": SYSTEM_PROMPT}] + list(messages)
+
+
+def render_prompt(tokenizer, messages):
+    """Formats messages with the ChatML template the model was trained on."""
+    return tokenizer.apply_chat_template(build_messages(messages), tokenize=False, add_generation_prompt=True)
+
+
+class SystemPromptCache:
+    """Past key/values of the shared system-prompt prefix, computed once per loaded model.
+
+    Every DevStudio prompt starts with the same ChatML system block, so its prefill can be done
+    once and a copy of the cache handed to each generation instead of recomputing it.
+    """
+
+    def __init__(self, model, tokenizer, system_prompt=SYSTEM_PROMPT):
+        prefix = tokenizer.apply_chat_template([{"role": "system", "content": system_prompt}], tokenize=False)
+        self.prefix_ids = tokenizer(prefix, return_tensors="pt")["input_ids"].to(model.device)
+        self.prefix_length = self.prefix_ids.shape[1]
+
+        # The first forward pass includes one-off warm-up costs, so time a second one as the per-request saving
+        self.past_key_values = self.prefill(model)
+        start = time.perf_counter()
+        self.prefill(model)
+        self.prefill_seconds = time.perf_counter() - start
+
+    def prefill(self, model):
+        with torch.no_grad():
+            outputs = model(input_ids=self.prefix_ids, past_key_values=DynamicCache(), use_cache=True)
+        return outputs.past_key_values
+
+    def matches(self, input_ids):
+        """True when a single tokenized prompt starts with the cached prefix and continues past it."""
+        return (
+            input_ids.shape[0] == 1
+            and input_ids.shape[1] > self.prefix_length
+            and torch.equal(input_ids[0, :self.prefix_length], self.prefix_ids[0])
+        )
+
+    def copy(self):
+        # Generation appends to the cache in place, so every request gets its own copy
+        return copy.deepcopy(self.past_key_values)
+
+
+class TimedStreamer(TextIteratorStreamer):
+    """Text streamer that also records time-to-first-token and the number of generated tokens."""
+
+    def __init__(self, tokenizer, timeout=None):
+        super().__init__(tokenizer, skip_prompt=True, skip_special_tokens=True, timeout=timeout)
+        self.start_time = time.perf_counter()
+        self.first_token_time = None
+        self.token_count = 0
+
+    def put(self, value):
+        # The first call carries the prompt ids, which are not generated tokens
+        if not (self.skip_prompt and self.next_tokens_are_prompt):
+            if self.first_token_time is None:
+                self.first_token_time = time.perf_counter()
+            self.token_count += value.numel()
+        super().put(value)
+
+    def stats(self):
+        end_time = time.perf_counter()
+        ttft = (self.first_token_time or end_time) - self.start_time
+        decode_time = end_time - (self.first_token_time or end_time)
+        return {
+            "ttft_seconds": round(ttft, 4),
+            "total_seconds": round(end_time - self.start_time, 4),
+            "generated_tokens": self.token_count,
+            # The first token is produced by the prefill, so the decode rate excludes it
+            "tokens_per_second": round((self.token_count - 1) / decode_time, 2) if self.token_count > 1 and decode_time > 0 else 0.0
+        }
+
+
+class CancelCriteria(StoppingCriteria):
+    """Stops generation as soon as the given event is set, e.g. when a client disconnects."""
+
+    def __init__(self, cancel_event):
+        self.cancel_event = cancel_event
+
+    def __call__(self, input_ids, scores, **kwargs):
+        return torch.full((input_ids.shape[0],), self.cancel_event.is_set(), dtype=torch.bool, device=input_ids.device)
+
+
+class HtmlCompletionCriteria(StoppingCriteria):
+    """Stops each row once its HTML document is complete.
+
+    A fenced answer ends at the fence that closes its opening ```html fence, an answer with no
+    fence before `</html>` ends there, and any row ends on EOS / <|im_end|>. Only the tokens
+    added since the previous call are decoded, so the check stays cheap for long generations.
+    """
+
+    FENCE = "```"
+    HTML_END = "</html>"
+
+    def __init__(self, tokenizer, prompt_length):
+        self.tokenizer = tokenizer
+        self.seen_length = prompt_length
+        self.stop_token_ids = {
+            token_id for token_id in [
+                tokenizer.eos_token_id,
+                tokenizer.convert_tokens_to_ids("<|im_end|>"),
+                tokenizer.convert_tokens_to_ids("<|endoftext|>")
+            ]
+            if isinstance(token_id, int) and token_id != tokenizer.unk_token_id
+        }
+        self.rows = None
+
+    def __call__(self, input_ids, scores, **kwargs):
+        if self.rows is None:
+            self.rows = [{"tail": "", "fences": 0, "done": False} for _ in range(input_ids.shape[0])]
+
+        new_tokens = input_ids[:, self.seen_length:].tolist()
+        self.seen_length = input_ids.shape[1]
+
+        for row, tokens in zip(self.rows, new_tokens):
+            if row["done"] or not tokens:
+                continue
+            if any(token in self.stop_token_ids for token in tokens):
+                row["done"] = True
+                continue
+            self.scan(row, self.tokenizer.decode(tokens, skip_special_tokens=True))
+
+        return torch.tensor([row["done"] for row in self.rows], dtype=torch.bool, device=input_ids.device)
+
+    def scan(self, row, text):
+        # Markers can be split across tokens, so search the carried-over tail plus the new text
+        buffer = row["tail"] + text
+        boundary = len(row["tail"])
+
+        # Count only matches that end inside the new text (earlier ones were already counted), in
+        # the order they appear: whether a fence was opened is decided by the text so far, not by
+        # the first chunk, so a split fence or a short preamble before it is still recognized
+        matches = []
+        for marker in (self.FENCE, self.HTML_END):
+            index = buffer.find(marker)
+            while index != -1:
+                if index + len(marker) > boundary:
+                    matches.append((index, marker))
+                index = buffer.find(marker, index + len(marker))
+
+        for _, marker in sorted(matches):
+            if marker == self.FENCE:
+                row["fences"] += 1
+            elif row["fences"] == 0:
+                row["done"] = True  # An unfenced document is complete at </html>
+            if row["fences"] >= 2:
+                row["done"] = True  # The fence that closes the opening ```html fence
+            if row["done"]:
+                break
+
+        row["tail"] = buffer[-(max(len(self.FENCE), len(self.HTML_END)) - 1):]
+
+
+def stream_generate(model, tokenizer, messages, max_new_tokens=1024, temperature=0.2, stats=None, prefix_cache=None, seed=None, stop_at_document_end=True):
+    """Yields decoded text chunks as soon as they are generated.
+
+    When a dict is passed as `stats`, it is filled with TTFT and tokens/sec once the stream ends.
+    A `seed` makes sampled generations reproducible, and `stop_at_document_end` ends decoding
+    as soon as the HTML answer is complete instead of running to `max_new_tokens`.
+    A `SystemPromptCache` skips the system-prompt prefill whenever the prompt starts with it.
+    Closing the generator early stops the underlying `model.generate` call.
+    """
+    prompt = render_prompt(tokenizer, messages)
+    inputs = tokenizer(prompt, return_tensors="pt").to(model.device)
+    streamer = TimedStreamer(tokenizer)
+    cancel_event = threading.Event()
+
+    stopping_criteria = StoppingCriteriaList([CancelCriteria(cancel_event)])
+    if stop_at_document_end:
+        stopping_criteria.append(HtmlCompletionCriteria(tokenizer, inputs["input_ids"].shape[1]))
+
+    generation_kwargs = dict(
+        **inputs,
+        streamer=streamer,
+        max_new_tokens=max_new_tokens,
+        eos_token_id=tokenizer.eos_token_id,
+        stopping_criteria=stopping_criteria
+    )
+    if temperature and temperature > 0:
+        generation_kwargs.update(do_sample=True, temperature=temperature)
+        if seed is not None:
+            torch.manual_seed(seed)
+    else:
+        generation_kwargs.update(do_sample=False)
+
+    # Only the tokens after the cached prefix are prefilled when a copy of the cache is passed in
+    use_prefix_cache = prefix_cache is not None and prefix_cache.matches(inputs["input_ids"])
+    if use_prefix_cache:
+        generation_kwargs["past_key_values"] = prefix_cache.copy()
+
+    errors = []
+
+    def run():
+        try:
+            with torch.no_grad():
+                model.generate(**generation_kwargs)
+        except Exception as e:
+            # Unblock the consumer, the error is re-raised on the calling thread
+            errors.append(e)
+            streamer.end()
+
+    worker = threading.Thread(target=run, daemon=True)
+    worker.start()
+    try:
+        for text in streamer:
+            if text:
+                yield text
+    finally:
+        cancel_event.set()
+        worker.join()
+
+    if errors:
+        raise errors[0]
+
+    if stats is not None:
+        stats.update(streamer.stats())
+        stats["prompt_tokens"] = inputs["input_ids"].shape[1]
+        stats["cached_prefix_tokens"] = prefix_cache.prefix_length if use_prefix_cache else 0
+        stats["prefill_saved_seconds"] = round(prefix_cache.prefill_seconds, 4) if use_prefix_cache else 0.0
@@ -2,6 +2,7 @@
 import os
 import torch
 from transformers import AutoTokenizer, AutoModelForCausalLM
+from devstudio_runtime import SHARD_SIZE
 
 model_id = "Qwen/Qwen2.5-Coder-1.5B-Instruct"
 save_directory = "models/base"
@@ -27,7 +28,8 @@ model = AutoModelForCausalLM.from_pretrained(
 )
 
 print(f"Saving model weight shards directly to: {save_directory}...")
-model.save_pretrained(save_directory)
+# Sharded safetensors let the loaders memory-map the weights instead of unpickling a copy
+model.save_pretrained(save_directory, safe_serialization=True, max_shard_size=SHARD_SIZE)
 
 print("\n--- Download and Saving Complete ---")
 print(f"Your unquantized baseline weights are stored cleanly inside: '{save_directory}/'")
\ No newline at end of file
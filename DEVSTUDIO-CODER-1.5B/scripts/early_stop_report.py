@@ -0,0 +1,85 @@
+# scripts/early_stop_report.py
+import os
+import json
+import time
+import argparse
+import torch
+from transformers import StoppingCriteriaList
+
+from devstudio_runtime import load_model, load_prompts, render_prompt, HtmlCompletionCriteria
+
+
+def generate(model, tokenizer, messages, max_new_tokens, early_stop):
+    inputs = tokenizer(render_prompt(tokenizer, messages), return_tensors="pt").to(model.device)
+    generation_kwargs = dict(
+        **inputs,
+        max_new_tokens=max_new_tokens,
+        do_sample=False,  # Greedy decoding so both runs produce the same tokens up to the stop point
+        eos_token_id=tokenizer.eos_token_id
+    )
+    if early_stop:
+        generation_kwargs["stopping_criteria"] = StoppingCriteriaList([HtmlCompletionCriteria(tokenizer, inputs["input_ids"].shape[1])])
+
+    start = time.perf_counter()
+    with torch.no_grad():
+        outputs = model.generate(**generation_kwargs)
+    seconds = time.perf_counter() - start
+
+    generated_ids = outputs[0][inputs["input_ids"].shape[1]:]
+    return tokenizer.decode(generated_ids, skip_special_tokens=True), len(generated_ids), seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure tokens and wall-time saved by structure-aware early stopping")
+    parser.add_argument("--model", default="models/final_merged")
+    parser.add_argument("--val-file", default="data/validation.jsonl")
+    parser.add_argument("--limit", type=int, help="Only use the first N validation prompts")
+    parser.add_argument("--max-new-tokens", type=int, default=1024)
+    parser.add_argument("--report", default="outputs/early_stop_report.json")
+    args = parser.parse_args()
+
+    tokenizer, model = load_model(args.model)
+    samples = load_prompts(args.val_file, args.limit)
+
+    rows = []
+    for idx, sample in enumerate(samples):
+        full_text, full_tokens, full_seconds = generate(model, tokenizer, sample["messages"], args.max_new_tokens, early_stop=False)
+        stop_text, stop_tokens, stop_seconds = generate(model, tokenizer, sample["messages"], args.max_new_tokens, early_stop=True)
+        rows.append({
+            "prompt": sample["messages"][-1]["content"],
+            "tokens_full": full_tokens,
+            "tokens_early_stop": stop_tokens,
+            "seconds_full": round(full_seconds, 3),
+            "seconds_early_stop": round(stop_seconds, 3),
+            # The early-stopped answer must be a prefix of the unconstrained one, never a different answer
+            "prefix_of_full": full_text.startswith(stop_text.rstrip())
+        })
+        print(f"[{idx + 1}/{len(samples)}] {full_tokens} -> {stop_tokens} tokens | {full_seconds:.2f}s -> {stop_seconds:.2f}s")
+
+    totals = {
+        "prompts": len(rows),
+        "max_new_tokens": args.max_new_tokens,
+        "tokens_full": sum(r["tokens_full"] for r in rows),
+        "tokens_early_stop": sum(r["tokens_early_stop"] for r in rows),
+        "seconds_full": round(sum(r["seconds_full"] for r in rows), 3),
+        "seconds_early_stop": round(sum(r["seconds_early_stop"] for r in rows), 3),
+        "all_prefixes": all(r["prefix_of_full"] for r in rows)
+    }
+    totals["tokens_saved"] = totals["tokens_full"] - totals["tokens_early_stop"]
+    totals["seconds_saved"] = round(totals["seconds_full"] - totals["seconds_early_stop"], 3)
+
+    print("\n" + "=" * 60)
+    print("EARLY STOPPING REPORT")
+    print("=" * 60)
+    print(f"Tokens : {totals['tokens_full']} -> {totals['tokens_early_stop']} ({totals['tokens_saved']} saved)")
+    print(f"Time   : {totals['seconds_full']}s -> {totals['seconds_early_stop']}s ({totals['seconds_saved']}s saved)")
+    print(f"Outputs unchanged up to the stop point: {totals['all_prefixes']}")
+
+    os.makedirs(os.path.dirname(args.report) or ".", exist_ok=True)
+    with open(args.report, "w", encoding="utf-8") as f:
+        json.dump({"totals": totals, "samples": rows}, f, indent=2)
+    print(f"\nReport saved to '{args.report}'.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,7 @@
 # scripts/run_local_tuned.py
 import os
 import sys
-import torch
-from transformers import AutoTokenizer, AutoModelForCausalLM
+from devstudio_runtime import load_model, stream_generate, SystemPromptCache
 
 model_path = "models/final_merged_model"
 
@@ -12,41 +11,18 @@ if not os.path.exists(model_path) or not os.listdir(model_path):
     print("Please ensure you have extracted your merged model zip into 'models/final_merged/'.")
     sys.exit(1)
 
-# 1. Hardware Detection
-print("Checking local hardware acceleration...")
-device = "cuda" if torch.cuda.is_available() else "cpu"
-print(f"Using device: {device}")
-
-# Determine optimal data type based on hardware
-if device == "cuda":
-    # Use FP16/BF16 on GPU to save memory and increase speed
-    dtype = torch.bfloat16 if torch.cuda.is_bf16_supported() else torch.float16
-else:
-    # Standard FP32 is the safest datatype for general CPUs
-    dtype = torch.float32
-
-# 2. Load Tokenizer and Model
+# 1. Load Tokenizer and Model on the best available device
 print(f"\nLoading fine-tuned DevStudio-1.5B from '{model_path}'...")
-tokenizer = AutoTokenizer.from_pretrained(model_path)
-
-# Load model (without device_map to bypass 'accelerate' package requirements)
-model = AutoModelForCausalLM.from_pretrained(
-    model_path,
-    torch_dtype=dtype
-)
-model.to(device)
+tokenizer, model = load_model(model_path)
+print(f"Using device: {model.device}")
 
 print("DevStudio-1.5B is loaded and ready.")
 
-# 3. Define the specialized DevStudio system prompt
-system_prompt = (
-    "You are DevStudio-1.5B, an in-editor coding assistant developed by DevStudio AI. "
-    "You are a highly specialized master of modern single-file HTML and Tailwind CSS designs. "
-    "Output fully functional HTML files with integrated Tailwind CSS via CDN, and provide "
-    "zero extra explanation outside the code blocks."
-)
+# 2. Prefill the specialized DevStudio system prompt once and reuse it for every prompt below
+prefix_cache = SystemPromptCache(model, tokenizer)
+print(f"Cached {prefix_cache.prefix_length} system prompt tokens ({prefix_cache.prefill_seconds:.3f}s prefill saved per prompt).")
 
-# 4. Interactive Terminal Loop
+# 3. Interactive Terminal Loop
 print("\n" + "="*50)
 print("       DevStudio-1.5B Local Playground")
 print("="*50)
@@ -62,34 +38,29 @@ while True:
             print("Exiting playground...")
             break
             
-        # Structure inputs into the ChatML schema the model was trained on
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ]
-        
-        prompt = tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
-        inputs = tokenizer(prompt, return_tensors="pt").to(model.device)
-        
-        print("\nGenerating layout...")
-        with torch.no_grad():
-            outputs = model.generate(
-                **inputs,
-                max_new_tokens=1024,   # High token limit for complete HTML structures
-                temperature=0.2,       # Low temperature keeps code generation precise
-                do_sample=True,
-                eos_token_id=tokenizer.eos_token_id
-            )
-            
-        generated_ids = outputs[0][inputs["input_ids"].shape[1]:]
-        response = tokenizer.decode(generated_ids, skip_special_tokens=True)
-        
-        # Display the output
+        # The system prompt is prepended and the ChatML schema applied by devstudio_runtime
+        messages = [{"role": "user", "content": user_prompt}]
+
+        # Display the output as it is generated
         print("\n" + "="*80)
         print("DEVSTUDIO-1.5B OUTPUT:")
         print("="*80)
-        print(response)
-        print("="*80)
+        stats = {}
+        for text in stream_generate(
+            model,
+            tokenizer,
+            messages,
+            max_new_tokens=1024,   # High token limit for complete HTML structures
+            temperature=0.2,       # Low temperature keeps code generation precise
+            stats=stats,
+            prefix_cache=prefix_cache
+        ):
+            print(text, end="", flush=True)
+        print("\n" + "="*80)
+        print(
+            f"{stats['generated_tokens']} tokens | TTFT {stats['ttft_seconds']:.2f}s | "
+            f"{stats['tokens_per_second']:.2f} tokens/sec | prefill saved {stats['prefill_saved_seconds']:.3f}s"
+        )
         
     except KeyboardInterrupt:
         print("\nExiting...")
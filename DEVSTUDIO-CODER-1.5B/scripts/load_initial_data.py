@@ -2,6 +2,8 @@
 import os
 import json
 
+from deduplicate import read_keys, record_key
+
 filepath = "data/train.jsonl"
 
 # Core system prompt to align the specialized frontend behavior
@@ -74,9 +76,13 @@ initial_branding_data = [
 # Ensure the parent data directory exists
 os.makedirs(os.path.dirname(filepath), exist_ok=True)
 
+# Skip conversations that are already in the file, so re-running never duplicates them
+existing_keys = read_keys(filepath)
+new_entries = [entry for entry in initial_branding_data if record_key(entry) not in existing_keys]
+
 # Append to the data file ("a" mode) so we do not overwrite your existing scraped components
 with open(filepath, "a", encoding="utf-8") as f:
-    for entry in initial_branding_data:
+    for entry in new_entries:
         f.write(json.dumps(entry) + "\n")
 
-print(f"Success! Appended {len(initial_branding_data)} branding constraints to '{filepath}'.")
\ No newline at end of file
+print(f"Success! Appended {len(new_entries)} branding constraints to '{filepath}' ({len(initial_branding_data) - len(new_entries)} already present).")
\ No newline at end of file
@@ -1,51 +1,175 @@
 # scripts/merge_lora.py
 import os
+import re
+import gc
+import json
+import shutil
+import argparse
 import torch
-from transformers import AutoModelForCausalLM, AutoTokenizer
-from peft import PeftModel
+from transformers import AutoConfig, AutoModelForCausalLM, AutoTokenizer
+from safetensors import safe_open
+from safetensors.torch import save_file
+from devstudio_runtime import SHARD_SIZE, safetensors_shards, peak_rss_mb
 
 base_model_path = "models/base"
 adapter_path = "models/final"
 save_path = "models/final_merged"
 
-# 1. Clear VRAM and trigger garbage collection to free memory
-import gc
-torch.cuda.empty_cache()
-gc.collect()
-
-print("Checking hardware acceleration...")
-device = "cuda" if torch.cuda.is_available() else "cpu"
-print(f"Using device: {device}")
-
-# Determine optimal dtype for weight merge
-dtype = torch.bfloat16 if torch.cuda.is_bf16_supported() else torch.float16
-print(f"Using precision: {dtype}")
-
-# 2. Load Base Tokenizer
-print("Loading base tokenizer...")
-tokenizer = AutoTokenizer.from_pretrained(base_model_path)
-
-# 3. Load Unquantized Base Model in 16-bit
-print(f"Loading unquantized base model from '{base_model_path}'...")
-base_model = AutoModelForCausalLM.from_pretrained(
-    base_model_path,
-    torch_dtype=dtype,
-    device_map=device
-)
-
-# 4. Attach the Trained Adapter to the Base Model
-print(f"Loading adapter weights from '{adapter_path}'...")
-peft_model = PeftModel.from_pretrained(base_model, adapter_path)
-
-# 5. Mathematically Fuse Weights
-print("Merging adapter weights with base model weights (weight fusion)...")
-merged_model = peft_model.merge_and_unload()
-
-# 6. Save Standalone Model
-print(f"Saving standalone merged model directly to '{save_path}'...")
-os.makedirs(save_path, exist_ok=True)
-merged_model.save_pretrained(save_path)
-tokenizer.save_pretrained(save_path)
-
-print("\n--- Weight Merge Complete ---")
-print(f"Your custom standalone model weights are saved cleanly inside: '{save_path}/'")
\ No newline at end of file
+# Keys saved by PEFT look like base_model.model.<module>.lora_A.weight
+LORA_KEY = re.compile(r"^base_model\.model\.(.+)\.lora_([AB])(?:\.default)?\.weight$")
+
+
+def merge_in_memory(base_model_path, adapter_path, save_path):
+    from peft import PeftModel
+
+    # 1. Clear VRAM and trigger garbage collection to free memory
+    torch.cuda.empty_cache()
+    gc.collect()
+
+    print("Checking hardware acceleration...")
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    print(f"Using device: {device}")
+
+    # Determine optimal dtype for weight merge (BF16 is only probed when a GPU is present)
+    dtype = torch.bfloat16 if device == "cuda" and torch.cuda.is_bf16_supported() else torch.float16
+    print(f"Using precision: {dtype}")
+
+    # 2. Load Base Tokenizer
+    print("Loading base tokenizer...")
+    tokenizer = AutoTokenizer.from_pretrained(base_model_path)
+
+    # 3. Load Unquantized Base Model in 16-bit
+    print(f"Loading unquantized base model from '{base_model_path}'...")
+    base_model = AutoModelForCausalLM.from_pretrained(
+        base_model_path,
+        torch_dtype=dtype,
+        device_map=device
+    )
+
+    # 4. Attach the Trained Adapter to the Base Model
+    print(f"Loading adapter weights from '{adapter_path}'...")
+    peft_model = PeftModel.from_pretrained(base_model, adapter_path)
+
+    # 5. Mathematically Fuse Weights
+    print("Merging adapter weights with base model weights (weight fusion)...")
+    merged_model = peft_model.merge_and_unload()
+
+    # 6. Save Standalone Model
+    print(f"Saving standalone merged model directly to '{save_path}'...")
+    os.makedirs(save_path, exist_ok=True)
+    # Sharded safetensors let the loaders memory-map the weights instead of unpickling a copy
+    merged_model.save_pretrained(save_path, safe_serialization=True, max_shard_size=SHARD_SIZE)
+    tokenizer.save_pretrained(save_path)
+
+
+def pattern_value(patterns, module_name, default):
+    # Same matching rule PEFT uses for rank_pattern / alpha_pattern keys
+    for pattern, value in patterns.items():
+        if re.match(rf"(.*\.)?({pattern})$", module_name):
+            return value
+    return default
+
+
+def load_lora_deltas(adapter_path):
+    """Reads the adapter into {base weight name: (lora_A, lora_B, scale)} without touching the base model."""
+    with open(os.path.join(adapter_path, "adapter_config.json"), "r", encoding="utf-8") as f:
+        config = json.load(f)
+    if config.get("use_dora") or config.get("modules_to_save"):
+        raise ValueError("Streaming merge supports plain LoRA only; use the in-memory merge for DoRA or modules_to_save adapters")
+
+    weights_path = os.path.join(adapter_path, "adapter_model.safetensors")
+    if not os.path.exists(weights_path):
+        raise FileNotFoundError(f"'{weights_path}' not found (streaming merge needs safetensors adapter weights)")
+
+    pairs = {}
+    with safe_open(weights_path, framework="pt", device="cpu") as f:
+        for key in f.keys():
+            match = LORA_KEY.match(key)
+            if not match:
+                raise ValueError(f"Unsupported adapter tensor '{key}'")
+            pairs.setdefault(match.group(1), {})[match.group(2)] = f.get_tensor(key)
+
+    deltas = {}
+    for module, pair in pairs.items():
+        r = pattern_value(config.get("rank_pattern") or {}, module, config["r"])
+        alpha = pattern_value(config.get("alpha_pattern") or {}, module, config["lora_alpha"])
+        scale = alpha / (r ** 0.5) if config.get("use_rslora") else alpha / r
+        deltas[f"{module}.weight"] = (pair["A"], pair["B"], scale, config.get("fan_in_fan_out", False))
+    return deltas
+
+
+def merge_streaming(base_model_path, adapter_path, save_path, dtype=None):
+    """Merges one base shard at a time on CPU, so peak memory is about one shard plus the adapter."""
+    shards = safetensors_shards(base_model_path)
+    if not shards:
+        raise FileNotFoundError(f"No safetensors shards in '{base_model_path}'. Re-run 'python scripts/download_base_model.py'.")
+
+    # 1. Load only the small LoRA matrices
+    print(f"Loading adapter weights from '{adapter_path}'...")
+    deltas = load_lora_deltas(adapter_path)
+    print(f"Adapter touches {len(deltas)} weight matrices.")
+
+    # 2. Fold lora_B @ lora_A * scale into each touched weight, one shard at a time
+    os.makedirs(save_path, exist_ok=True)
+    weight_map, total_size, merged = {}, 0, set()
+    for idx, shard in enumerate(shards):
+        tensors = {}
+        with safe_open(shard, framework="pt", device="cpu") as f:
+            metadata = f.metadata()
+            for name in f.keys():
+                tensor = f.get_tensor(name)
+                out_dtype = dtype or tensor.dtype
+                if name in deltas:
+                    lora_a, lora_b, scale, fan_in_fan_out = deltas[name]
+                    delta = (lora_b.float() @ lora_a.float()) * scale
+                    tensor = tensor.float() + (delta.T if fan_in_fan_out else delta)
+                    merged.add(name)
+                tensors[name] = tensor.to(out_dtype).contiguous()
+                total_size += tensors[name].numel() * tensors[name].element_size()
+
+        shard_name = os.path.basename(shard)
+        save_file(tensors, os.path.join(save_path, shard_name), metadata=metadata or {"format": "pt"})
+        weight_map.update({name: shard_name for name in tensors})
+        del tensors
+        gc.collect()
+        print(f"[{idx + 1}/{len(shards)}] Wrote '{shard_name}' | peak RSS {peak_rss_mb():.0f} MB")
+
+    missing = sorted(set(deltas) - merged)
+    if missing:
+        raise ValueError(f"Adapter weights not found in the base model: {missing[:5]}")
+
+    if len(shards) > 1:
+        with open(os.path.join(save_path, "model.safetensors.index.json"), "w", encoding="utf-8") as f:
+            json.dump({"metadata": {"total_size": total_size}, "weight_map": weight_map}, f, indent=2)
+
+    # 3. Copy config, generation config and tokenizer next to the merged shards
+    config = AutoConfig.from_pretrained(base_model_path)
+    if dtype is not None:
+        config.torch_dtype = dtype
+    config.save_pretrained(save_path)
+    generation_config = os.path.join(base_model_path, "generation_config.json")
+    if os.path.exists(generation_config):
+        shutil.copy(generation_config, save_path)
+    AutoTokenizer.from_pretrained(base_model_path).save_pretrained(save_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fuse trained LoRA adapters into the base model weights")
+    parser.add_argument("--base", default=base_model_path)
+    parser.add_argument("--adapter", default=adapter_path)
+    parser.add_argument("--output", default=save_path)
+    parser.add_argument("--streaming", action="store_true", help="Merge shard by shard on CPU instead of loading the whole model")
+    parser.add_argument("--dtype", choices=["float16", "bfloat16", "float32"], help="Output dtype for --streaming (defaults to the stored dtype)")
+    args = parser.parse_args()
+
+    if args.streaming:
+        merge_streaming(args.base, args.adapter, args.output, getattr(torch, args.dtype) if args.dtype else None)
+    else:
+        merge_in_memory(args.base, args.adapter, args.output)
+
+    print("\n--- Weight Merge Complete ---")
+    print(f"Your custom standalone model weights are saved cleanly inside: '{args.output}/'")
+
+
+if __name__ == "__main__":
+    main()
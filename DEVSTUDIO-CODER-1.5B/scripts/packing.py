@@ -0,0 +1,57 @@
+# scripts/packing.py
+import bisect
+import random
+
+
+def random_batches(lengths, batch_size, seed=42):
+    indices = list(range(len(lengths)))
+    random.Random(seed).shuffle(indices)
+    return [[lengths[i] for i in indices[k:k + batch_size]] for k in range(0, len(indices), batch_size)]
+
+
+def length_grouped_batches(lengths, batch_size, seed=42, megabatch_mult=50):
+    # Mirrors the Trainer's group_by_length sampler: shuffle, then sort within large megabatches
+    indices = list(range(len(lengths)))
+    random.Random(seed).shuffle(indices)
+    megabatch = batch_size * megabatch_mult
+    batches = []
+    for k in range(0, len(indices), megabatch):
+        group = sorted(indices[k:k + megabatch], key=lambda i: lengths[i], reverse=True)
+        batches.extend([[lengths[i] for i in group[j:j + batch_size]] for j in range(0, len(group), batch_size)])
+    return batches
+
+
+def packed_rows(lengths, max_length):
+    """Best-fit-decreasing packing (TRL's "bfd" strategy) of samples into rows of max_length tokens."""
+    remaining = []  # Sorted free capacity of every open row
+    for length in sorted(lengths, reverse=True):
+        slot = bisect.bisect_left(remaining, length)
+        if slot < len(remaining):
+            capacity = remaining.pop(slot) - length
+        else:
+            capacity = max_length - length
+        bisect.insort(remaining, capacity)
+    return len(remaining)
+
+
+def padding_ratio(batches):
+    padded = sum(max(batch) * len(batch) for batch in batches)
+    return round(1 - sum(sum(batch) for batch in batches) / padded, 4) if padded else 0.0
+
+
+def padding_report(lengths, batch_size, max_length, seed=42):
+    """Estimates the share of padding tokens per epoch for plain, length-grouped and packed batches."""
+    rows = packed_rows(lengths, max_length)
+    return {
+        "samples": len(lengths),
+        "tokens": sum(lengths),
+        "padded": {"padding_ratio": padding_ratio(random_batches(lengths, batch_size, seed))},
+        "group_by_length": {"padding_ratio": padding_ratio(length_grouped_batches(lengths, batch_size, seed))},
+        # Packed rows are padding-free; the unused tail of each row is simply never materialized
+        "packing": {
+            "padding_ratio": 0.0,
+            "rows": rows,
+            "row_fill": round(sum(lengths) / (rows * max_length), 4) if rows else 0.0,
+            "steps_saved": round(1 - rows / len(lengths), 4) if lengths else 0.0
+        }
+    }
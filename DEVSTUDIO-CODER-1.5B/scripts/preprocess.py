@@ -0,0 +1,103 @@
+# scripts/preprocess.py
+import os
+import json
+import glob
+import hashlib
+import argparse
+import yaml
+from datasets import DatasetDict, load_dataset, load_from_disk
+from transformers import AutoTokenizer
+
+CACHE_ROOT = "data/cache"
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def artifact_key(tokenizer, model_dir, train_file, val_file, max_length):
+    """Hashes everything the token ids depend on: tokenizer files, chat template and data contents."""
+    parts = [type(tokenizer).__name__, tokenizer.chat_template or "", str(max_length)]
+    for path in sorted(glob.glob(os.path.join(model_dir, "*"))):
+        name = os.path.basename(path)
+        if os.path.isfile(path) and name.startswith(("tokenizer", "vocab", "merges", "special_tokens", "chat_template")):
+            parts.append(f"{name}:{file_sha256(path)}")
+    parts += [file_sha256(train_file), file_sha256(val_file)]
+    return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()[:16]
+
+
+def tokenize_split(tokenizer, path, max_length):
+    dataset = load_dataset("json", data_files=path, split="train")
+
+    def tokenize(sample):
+        # transformers 5 returns a BatchEncoding unless return_dict=False is given
+        input_ids = tokenizer.apply_chat_template(sample["messages"], tokenize=True, return_dict=False)
+        return {"input_ids": input_ids, "length": len(input_ids), "over_max_length": len(input_ids) > max_length}
+
+    # Only token ids are kept, so the trainer sees an already processed dataset and skips tokenization
+    return dataset.map(tokenize, remove_columns=dataset.column_names, desc=f"Tokenizing {path}")
+
+
+def load_or_build(tokenizer, train_config, cache_root=CACHE_ROOT):
+    """Returns the tokenized train/validation splits, building the cached artifact on first use.
+
+    The artifact is an Arrow dataset saved with `save_to_disk`, which `load_from_disk` memory-maps,
+    so later runs and resumes start without re-tokenizing.
+    """
+    key = artifact_key(
+        tokenizer, train_config["model_id"], train_config["train_file"], train_config["val_file"], train_config["max_length"]
+    )
+    artifact_dir = os.path.join(cache_root, f"tokenized-{key}")
+
+    if os.path.exists(os.path.join(artifact_dir, "meta.json")):
+        print(f"Loading pre-tokenized dataset from '{artifact_dir}'...")
+        return load_from_disk(artifact_dir)
+
+    print("No matching pre-tokenized dataset found. Tokenizing with the chat template...")
+    dataset = DatasetDict({
+        "train": tokenize_split(tokenizer, train_config["train_file"], train_config["max_length"]),
+        "validation": tokenize_split(tokenizer, train_config["val_file"], train_config["max_length"])
+    })
+    dataset.save_to_disk(artifact_dir)
+
+    meta = {"key": key, "max_length": train_config["max_length"]}
+    for split, data in dataset.items():
+        over = [i for i, flagged in enumerate(data["over_max_length"]) if flagged]
+        meta[split] = {
+            "samples": len(data),
+            "tokens": sum(data["length"]),
+            "max_tokens": max(data["length"], default=0),
+            "over_max_length": over
+        }
+        if over:
+            print(f"Warning: {len(over)} {split} samples exceed max_length={train_config['max_length']} and will be truncated (rows {over[:10]}).")
+
+    # meta.json is written last, so an interrupted build is never mistaken for a complete artifact
+    with open(os.path.join(artifact_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    print(f"Saved pre-tokenized dataset to '{artifact_dir}'.")
+    return dataset
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tokenize the training splits once into a cached, memory-mappable artifact")
+    parser.add_argument("--config", default="configs/train.yaml")
+    parser.add_argument("--cache-root", default=CACHE_ROOT)
+    args = parser.parse_args()
+
+    with open(args.config, "r") as f:
+        train_config = yaml.safe_load(f)
+
+    tokenizer = AutoTokenizer.from_pretrained(train_config["model_id"])
+    dataset = load_or_build(tokenizer, train_config, args.cache_root)
+    for split, data in dataset.items():
+        flagged = sum(data["over_max_length"])
+        print(f"{split:<10} {len(data)} samples | {sum(data['length'])} tokens | {flagged} over max_length")
+
+
+if __name__ == "__main__":
+    main()
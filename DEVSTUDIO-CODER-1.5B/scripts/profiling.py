@@ -0,0 +1,151 @@
+# scripts/profiling.py
+import os
+import json
+import time
+import torch
+from transformers import TrainerCallback
+
+from devstudio_runtime import peak_rss_mb
+
+PHASES = ["data", "forward_backward", "optimizer", "other"]
+
+
+class StepProfiler(TrainerCallback):
+    """Splits every optimizer step into data loading, forward/backward, optimizer and bookkeeping time.
+
+    Token counts come from the wrapped data collator (see `wrap_collator`), so tokens/sec and the
+    padding fraction reflect the batches that were actually built. Checkpoint saves are timed
+    separately and kept out of the next step's data time. One JSON line is written per step.
+    """
+
+    def __init__(self, profile_path="outputs/train_profile.jsonl", summary_path="outputs/train_profile_summary.json"):
+        self.profile_path = profile_path
+        self.summary_path = summary_path
+        self.cuda = torch.cuda.is_available()
+        self.steps = []
+        self.saves = []
+        self.pending_tokens = 0
+        self.pending_real_tokens = 0
+        self.last_event = None
+        self.marks = {}
+        self.file = None
+
+    def wrap_collator(self, collator):
+        def collate(features):
+            batch = collator(features)
+            input_ids = batch["input_ids"]
+            self.pending_tokens += input_ids.numel()
+            # Padding-free (packed) batches carry no attention mask and no padding
+            mask = batch.get("attention_mask")
+            self.pending_real_tokens += int(mask.sum()) if mask is not None else input_ids.numel()
+            return batch
+        return collate
+
+    def now(self):
+        # CUDA kernels run asynchronously, so phase boundaries are only meaningful after a sync
+        if self.cuda:
+            torch.cuda.synchronize()
+        return time.perf_counter()
+
+    def on_train_begin(self, args, state, control, **kwargs):
+        if state.is_world_process_zero:
+            os.makedirs(os.path.dirname(self.profile_path), exist_ok=True)
+            self.file = open(self.profile_path, "a", encoding="utf-8")
+        self.last_event = self.now()
+
+    def on_step_begin(self, args, state, control, **kwargs):
+        if self.cuda:
+            torch.cuda.reset_peak_memory_stats()
+        self.marks = {"begin": self.now()}
+
+    def on_pre_optimizer_step(self, args, state, control, **kwargs):
+        self.marks["pre_optimizer"] = self.now()
+
+    def on_optimizer_step(self, args, state, control, **kwargs):
+        self.marks["optimizer"] = self.now()
+
+    def on_step_end(self, args, state, control, **kwargs):
+        end = self.now()
+        begin = self.marks["begin"]
+        pre_optimizer = self.marks.get("pre_optimizer", end)
+        optimizer = self.marks.get("optimizer", pre_optimizer)
+
+        step_seconds = end - self.last_event
+        record = {
+            "step": state.global_step,
+            "step_seconds": round(step_seconds, 4),
+            "data": round(begin - self.last_event, 4),
+            "forward_backward": round(pre_optimizer - begin, 4),
+            "optimizer": round(optimizer - pre_optimizer, 4),
+            "other": round(end - optimizer, 4),
+            "tokens": self.pending_tokens,
+            "real_tokens": self.pending_real_tokens,
+            "tokens_per_second": round(self.pending_real_tokens / step_seconds, 2) if step_seconds > 0 else 0.0,
+            "padding_fraction": round(1 - self.pending_real_tokens / self.pending_tokens, 4) if self.pending_tokens else 0.0,
+            "peak_memory_mb": round(torch.cuda.max_memory_allocated() / 2**20 if self.cuda else peak_rss_mb(), 1)
+        }
+        self.steps.append(record)
+        self.pending_tokens = self.pending_real_tokens = 0
+        self.last_event = end
+
+        if self.file is not None:
+            self.file.write(json.dumps(record) + "\n")
+            self.file.flush()
+
+    def on_log(self, args, state, control, **kwargs):
+        self.last_event = self.now()
+
+    def on_evaluate(self, args, state, control, **kwargs):
+        # Evaluation batches go through the same collator and must not count towards the next step
+        self.pending_tokens = self.pending_real_tokens = 0
+        self.last_event = self.now()
+
+    def on_save(self, args, state, control, **kwargs):
+        # The Trainer saves right after the step (and any logging/evaluation) finished
+        end = self.now()
+        save = {"step": state.global_step, "save_seconds": round(end - self.last_event, 4)}
+        self.saves.append(save)
+        self.last_event = end
+        if self.file is not None:
+            self.file.write(json.dumps(save) + "\n")
+            self.file.flush()
+
+    def summary(self):
+        # The first step includes one-off warm-up costs, so it is left out of the averages when possible
+        steps = self.steps[1:] if len(self.steps) > 1 else self.steps
+        total = sum(s["step_seconds"] for s in steps)
+        tokens = sum(s["tokens"] for s in steps)
+        real_tokens = sum(s["real_tokens"] for s in steps)
+        phases = {phase: round(sum(s[phase] for s in steps), 4) for phase in PHASES}
+        return {
+            "steps": len(self.steps),
+            "mean_step_seconds": round(total / len(steps), 4) if steps else 0.0,
+            "phase_share": {phase: round(seconds / total, 4) if total else 0.0 for phase, seconds in phases.items()},
+            "bottleneck": max(phases, key=phases.get) if steps else None,
+            "tokens_per_second": round(real_tokens / total, 2) if total else 0.0,
+            "padding_fraction": round(1 - real_tokens / tokens, 4) if tokens else 0.0,
+            "peak_memory_mb": max((s["peak_memory_mb"] for s in self.steps), default=0.0),
+            "saves": len(self.saves),
+            "mean_save_seconds": round(sum(s["save_seconds"] for s in self.saves) / len(self.saves), 4) if self.saves else 0.0
+        }
+
+    def on_train_end(self, args, state, control, **kwargs):
+        if self.file is None:
+            return
+        self.file.close()
+        self.file = None
+
+        summary = self.summary()
+        with open(self.summary_path, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+
+        print("\n" + "=" * 60)
+        print("TRAINING STEP PROFILE")
+        print("=" * 60)
+        print(f"Mean step time : {summary['mean_step_seconds']}s over {summary['steps']} steps (bottleneck: {summary['bottleneck']})")
+        for phase in PHASES:
+            print(f"  {phase:<17}: {summary['phase_share'][phase]:.1%}")
+        print(f"Throughput     : {summary['tokens_per_second']} tokens/sec | padding {summary['padding_fraction']:.1%}")
+        print(f"Peak memory    : {summary['peak_memory_mb']} MB")
+        print(f"Checkpoints    : {summary['saves']} saved, {summary['mean_save_seconds']}s each")
+        print(f"Profile saved to '{self.profile_path}' and '{self.summary_path}'.")
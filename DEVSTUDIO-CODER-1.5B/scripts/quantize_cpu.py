@@ -0,0 +1,164 @@
+# scripts/quantize_cpu.py
+import os
+import sys
+import json
+import time
+import difflib
+import argparse
+import subprocess
+import torch
+from transformers import AutoModelForCausalLM, AutoTokenizer
+
+from devstudio_runtime import (
+    load_model,
+    load_prompts,
+    render_prompt,
+    quantize_for_cpu,
+    current_rss_mb,
+    peak_rss_mb,
+    QUANTIZED_WEIGHTS_NAME
+)
+
+
+def save_quantized(model_path, output_dir):
+    """Quantizes the FP32 model to int8 and saves it next to the source model for fast CPU loads."""
+    print(f"Loading '{model_path}' in FP32 on cpu...")
+    tokenizer = AutoTokenizer.from_pretrained(model_path)
+    model = AutoModelForCausalLM.from_pretrained(model_path, torch_dtype=torch.float32)
+
+    print("Quantizing Linear layers to int8...")
+    quantized = quantize_for_cpu(model)
+
+    os.makedirs(output_dir, exist_ok=True)
+    torch.save(quantized, os.path.join(output_dir, QUANTIZED_WEIGHTS_NAME))
+    tokenizer.save_pretrained(output_dir)
+    model.config.save_pretrained(output_dir)
+    print(f"Saved int8 model to '{output_dir}/{QUANTIZED_WEIGHTS_NAME}'.")
+
+
+def run_worker(mode, model_path, val_file, limit, max_new_tokens):
+    """Loads one variant, generates greedily for the validation prompts and prints a JSON result line."""
+    torch.manual_seed(0)
+    rss_before = current_rss_mb()
+    start = time.perf_counter()
+    tokenizer, model = load_model(model_path, quantize="int8" if mode == "int8" else None, device="cpu")
+    load_seconds = time.perf_counter() - start
+    rss_loaded = current_rss_mb()
+
+    samples = []
+    for sample in load_prompts(val_file, limit):
+        inputs = tokenizer(render_prompt(tokenizer, sample["messages"]), return_tensors="pt")
+        start = time.perf_counter()
+        with torch.no_grad():
+            outputs = model.generate(
+                **inputs,
+                max_new_tokens=max_new_tokens,
+                do_sample=False,  # Greedy decoding so both variants are directly comparable
+                eos_token_id=tokenizer.eos_token_id
+            )
+        seconds = time.perf_counter() - start
+        generated_ids = outputs[0][inputs["input_ids"].shape[1]:]
+        samples.append({
+            "seconds": seconds,
+            "generated_tokens": len(generated_ids),
+            "output": tokenizer.decode(generated_ids, skip_special_tokens=True),
+            "reference": sample["reference"]
+        })
+
+    print(json.dumps({
+        "mode": mode,
+        "load_seconds": load_seconds,
+        "model_rss_mb": rss_loaded - rss_before,
+        "peak_rss_mb": peak_rss_mb(),
+        "samples": samples
+    }))
+
+
+def measure(mode, args):
+    # Each variant runs in its own process so RSS numbers are not polluted by the other model
+    command = [
+        sys.executable, os.path.abspath(__file__),
+        "--worker", mode,
+        "--model", args.int8_model if mode == "int8" and args.int8_model else args.model,
+        "--val-file", args.val_file,
+        "--limit", str(args.limit),
+        "--max-new-tokens", str(args.max_new_tokens)
+    ]
+    print(f"\n--- Measuring {mode} ---")
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        print(result.stderr)
+        sys.exit(f"Error: {mode} worker failed.")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def summarize(result):
+    samples = result["samples"]
+    seconds = sum(s["seconds"] for s in samples)
+    tokens = sum(s["generated_tokens"] for s in samples)
+    return {
+        "load_seconds": round(result["load_seconds"], 2),
+        "model_rss_mb": round(result["model_rss_mb"], 1),
+        "peak_rss_mb": round(result["peak_rss_mb"], 1),
+        "mean_latency_seconds": round(seconds / len(samples), 3) if samples else 0.0,
+        "tokens_per_second": round(tokens / seconds, 2) if seconds else 0.0,
+        "reference_similarity": round(sum(similarity(s["output"], s["reference"]) for s in samples) / len(samples), 4) if samples else 0.0
+    }
+
+
+def similarity(a, b):
+    return difflib.SequenceMatcher(None, a, b, autojunk=False).ratio()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Quantize DevStudio-1.5B for CPU inference and measure the trade-off")
+    parser.add_argument("--model", default="models/final_merged")
+    parser.add_argument("--output", default="models/final_merged_int8", help="Where --save writes the int8 artifact")
+    parser.add_argument("--save", action="store_true", help="Save the int8 model before evaluating it")
+    parser.add_argument("--int8-model", help="Evaluate a saved int8 directory instead of quantizing on the fly")
+    parser.add_argument("--val-file", default="data/validation.jsonl")
+    parser.add_argument("--limit", type=int, default=10, help="Number of validation prompts to generate")
+    parser.add_argument("--max-new-tokens", type=int, default=256)
+    parser.add_argument("--report", default="outputs/quantization_report.json")
+    parser.add_argument("--worker", choices=["fp32", "int8"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.int8_model or args.model, args.val_file, args.limit, args.max_new_tokens)
+        return
+
+    if args.save:
+        save_quantized(args.model, args.output)
+        args.int8_model = args.output
+
+    fp32 = measure("fp32", args)
+    int8 = measure("int8", args)
+
+    # Quality check: how closely the int8 outputs track the FP32 outputs on the same prompts
+    pairs = list(zip(fp32["samples"], int8["samples"]))
+    agreement = [similarity(a["output"], b["output"]) for a, b in pairs]
+    report = {
+        "model": args.model,
+        "prompts": len(pairs),
+        "max_new_tokens": args.max_new_tokens,
+        "fp32": summarize(fp32),
+        "int8": summarize(int8),
+        "int8_vs_fp32_similarity": round(sum(agreement) / len(agreement), 4) if agreement else 0.0,
+        "int8_vs_fp32_exact_matches": sum(a["output"] == b["output"] for a, b in pairs)
+    }
+
+    print("\n" + "=" * 60)
+    print("CPU QUANTIZATION REPORT")
+    print("=" * 60)
+    for key in ["load_seconds", "model_rss_mb", "peak_rss_mb", "mean_latency_seconds", "tokens_per_second", "reference_similarity"]:
+        print(f"{key:<24} fp32: {report['fp32'][key]:>10}   int8: {report['int8'][key]:>10}")
+    print(f"int8 vs fp32 similarity : {report['int8_vs_fp32_similarity']} ({report['int8_vs_fp32_exact_matches']}/{len(pairs)} identical)")
+
+    os.makedirs(os.path.dirname(args.report) or ".", exist_ok=True)
+    with open(args.report, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport saved to '{args.report}'.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+# scripts/response_cache.py
+import os
+import re
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+def model_identity(model_path, *variant):
+    """Identifies a loaded model by its path, load variant and the files it was loaded from.
+
+    Re-merging or re-downloading weights changes file sizes/mtimes, which invalidates the disk tier.
+    """
+    parts = [os.path.abspath(model_path)] + [str(v) for v in variant]
+    if os.path.isdir(model_path):
+        for name in sorted(os.listdir(model_path)):
+            path = os.path.join(model_path, name)
+            if os.path.isfile(path):
+                stat = os.stat(path)
+                parts.append(f"{name}:{stat.st_size}:{int(stat.st_mtime)}")
+    return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()[:16]
+
+
+def normalize_messages(messages):
+    # Whitespace differences never change what the user asked for
+    return [
+        {"role": m["role"], "content": re.sub(r"\s+", " ", str(m["content"])).strip()}
+        for m in messages
+    ]
+
+
+class ResponseCache:
+    """LRU cache of generated responses with an optional on-disk tier.
+
+    Keys hash the normalized messages, the model identity and the generation parameters.
+    Sampled generations are only cacheable when they carry a seed, since otherwise the same
+    request is expected to return a different answer.
+    """
+
+    def __init__(self, max_entries=256, cache_dir=None):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.counts = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "uncacheable": 0}
+
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, messages, model_id, max_new_tokens, temperature, seed=None):
+        sampled = bool(temperature and temperature > 0)
+        if sampled and seed is None:
+            with self.lock:
+                self.counts["uncacheable"] += 1
+            return None
+
+        payload = {
+            "messages": normalize_messages(messages),
+            "model": model_id,
+            "max_new_tokens": max_new_tokens,
+            "temperature": temperature if sampled else 0.0,
+            "seed": seed if sampled else None
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def disk_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def get(self, key):
+        if key is None:
+            return None
+
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.counts["memory_hits"] += 1
+                return self.entries[key]
+
+        value = self.read_disk(key)
+        with self.lock:
+            if value is None:
+                self.counts["misses"] += 1
+                return None
+            self.counts["disk_hits"] += 1
+            self.remember(key, value)
+        return value
+
+    def put(self, key, value):
+        if key is None:
+            return
+        with self.lock:
+            self.remember(key, value)
+        self.write_disk(key, value)
+
+    def remember(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def read_disk(self, key):
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self.disk_path(key), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def write_disk(self, key, value):
+        if not self.cache_dir:
+            return
+        path = self.disk_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Write to a temporary file first so a crash never leaves a truncated entry behind
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(value, f)
+        os.replace(tmp_path, path)
+
+    def stats(self):
+        with self.lock:
+            hits = self.counts["memory_hits"] + self.counts["disk_hits"]
+            lookups = hits + self.counts["misses"]
+            return dict(
+                self.counts,
+                hits=hits,
+                hit_rate=round(hits / lookups, 4) if lookups else 0.0,
+                entries=len(self.entries)
+            )
@@ -2,14 +2,19 @@ import os
 import re
 import json
 import html
-import requests
+import hashlib
+import argparse
 from bs4 import BeautifulSoup
 
+from crawler import Crawler
+from deduplicate import read_keys, answer_key
+from annotators import GeminiAnnotator, FallbackAnnotator, AnnotationCache, annotate_blocks, PLACEHOLDER_KEYS, GEMINI_ENDPOINT
+
 # Setup file paths and sources
 filepath = "data/train.jsonl"
-url = "https://flowbite.com/docs/forms/phone-input/" # scrape flowbite 
+DEFAULT_URL = "https://flowbite.com/docs/forms/phone-input/" # scrape flowbite 
 
-GEMINI_API_KEY = "GEMINI_API_KEY"  
+GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY", "GEMINI_API_KEY")
 
 # Must match the system prompt used in scripts/load_initial_data.py
 system_prompt = (
@@ -19,92 +24,23 @@ system_prompt = (
     "zero extra explanation outside the code blocks."
 )
 
-headers = {
-    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-}
-
-def generate_fallback_prompt(html_code):
-    """Heuristic fallback prompt generator if the Gemini API call fails or is not configured."""
-    html_lower = html_code.lower()
-    if "data-dismiss-target" in html_lower or "close" in html_lower:
-        return "Create an interactive dismissible status alert component with a close button using HTML and Tailwind CSS."
-    elif "svg" in html_lower:
-        return "Design a modern status alert component featuring a warning or info icon using HTML and Tailwind CSS."
-    elif "border" in html_lower:
-        return "Design a set of responsive bordered status alerts (info, warning, danger, success) using HTML and Tailwind CSS."
-    elif "list" in html_lower or "<ul" in html_lower:
-        return "Design a detailed responsive list-style status alert layout with custom bullets, styled text, and background containers using HTML and Tailwind CSS."
-    elif "additional-content" in html_lower or "read more" in html_lower:
-        return "Design a rich, multi-paragraph alert panel containing additional helper text, inline links, and action buttons in HTML and Tailwind CSS."
-    
-    return "Design a set of responsive warning, info, danger, and success alert components with rounded corners using HTML and Tailwind CSS."
-
-def generate_prompt_via_gemini(html_code, api_key):
-    """Calls Gemini API to generate a precise prompt corresponding to the specific HTML/Tailwind styling."""
-    if not api_key or api_key == "YOUR_GEMINI_API_KEY":
-        return None
-        
-    # Using Gemini 1.5 Flash for rapid and cost-effective text generation
-    endpoint = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-flash-lite-latest:generateContent?key={api_key}"
-    headers_api = {"Content-Type": "application/json"}
-    
-    prompt_instruction = (
-        "You are an expert annotation assistant building a fine-tuning dataset for an HTML generation model. "
-        "Review the HTML code provided below, which contains styled status alert elements using Tailwind CSS. "
-        "Your task is to draft a natural, direct, and concise request (1 to 2 sentences) that a developer would write to get this exact output. "
-        "Highlight specific layout characteristics, custom styles (like colored borders, brand-colored backgrounds, soft alert elements), "
-        "and details such as icons, dismissible close buttons, bullet lists, or inline action elements. "
-        "Strictly return ONLY the plain text prompt. Do not write any preambles, markdown formatting, or quotes around the prompt.\n\n"
-        f"HTML snippet to convert into a user prompt:\n```html\n{html_code}\n```"
-    )
-    
-    payload = {
-        "contents": [
-            {
-                "parts": [
-                    {"text": prompt_instruction}
-                ]
-            }
-        ]
-    }
-    
-    try:
-        response = requests.post(endpoint, headers=headers_api, json=payload, timeout=12)
-        if response.status_code == 200:
-            res_data = response.json()
-            generated_text = res_data["candidates"][0]["content"]["parts"][0]["text"]
-            return generated_text.strip()
-        else:
-            print(f"Gemini API Error [{response.status_code}]: {response.text}")
-            return None
-    except Exception as e:
-        print(f"Failed to communicate with Gemini API: {e}")
-        return None
-
-print(f"Fetching raw Flowbite Alert documentation from: {url}")
-response = requests.get(url, headers=headers)
-
-if response.status_code != 200:
-    print(f"Could not reach page. HTTP Status: {response.status_code}")
-else:
-    soup = BeautifulSoup(response.text, "html.parser")
-    
+def extract_html_blocks(page_html, seen=None):
+    """Returns the pure HTML snippets of a documentation page, skipping blocks already in `seen`.
+
+    Blocks are deduplicated by content hash, so repeated snippets across pages are dropped in O(1).
+    """
+    seen = set() if seen is None else seen
+    soup = BeautifulSoup(page_html, "html.parser")
+
     # Locate documentation code content blocks
     raw_blocks = []
-    for pre in soup.find_all("pre"):
-        code_tag = pre.find("code")
-        if code_tag:
-            code_text = code_tag.get_text()
-        else:
-            code_text = pre.get_text()
-        
+    candidates = [(pre.find("code") or pre).get_text() for pre in soup.find_all("pre")]
+    candidates += [code_tag.get_text() for code_tag in soup.find_all("code")]
+    for code_text in candidates:
         cleaned = code_text.strip()
-        if cleaned and cleaned not in raw_blocks:
-            raw_blocks.append(cleaned)
-            
-    for code_tag in soup.find_all("code"):
-        cleaned = code_tag.get_text().strip()
-        if cleaned and cleaned not in raw_blocks:
+        digest = hashlib.sha256(cleaned.encode("utf-8")).hexdigest()
+        if cleaned and digest not in seen:
+            seen.add(digest)
             raw_blocks.append(cleaned)
 
     # Filter for valid, pure HTML structures
@@ -113,28 +49,21 @@ else:
         # Check standard layout markers
         if not code.startswith("<") or not code.endswith(">"):
             continue
-            
+
         # Ignore configuration, setup scripts or JS-based UI library templates
         if any(keyword in code for keyword in ["className=", "export default", "import ", "const ", "let ", "function "]):
             if not ("<script" in code or "<style" in code):
                 continue
-                
-        # Confirm it references standard flowbite/banner elements
-        html_blocks.append(code)
 
-    print(f"Found {len(html_blocks)} pure HTML bottom-navigation code layouts.")
-    
-    # Set up destination output directory
-    os.makedirs(os.path.dirname(filepath), exist_ok=True)
-    appended_count = 0
-    
-    for idx, raw_html in enumerate(html_blocks):
-        clean_html_code = raw_html.strip()
-        if len(clean_html_code) < 50:
+        if len(code) < 50:
             continue
-            
-        # Construct single-file wrapper
-        cdn_wrapped_html = f"""<!DOCTYPE html>
+        html_blocks.append(code)
+    return html_blocks
+
+
+def wrap_with_cdn(clean_html_code):
+    """Construct single-file wrapper"""
+    return f"""<!DOCTYPE html>
 <html lang="en">
 <head>
   <meta charset="UTF-8">
@@ -202,29 +131,94 @@ else:
 </body>
 </html>"""
 
-        # Generate prompt using Gemini or fall back dynamically if needed
-        print(f"[{idx+1}/{len(html_blocks)}] Generating prompt...")
-        prompt = generate_prompt_via_gemini(clean_html_code, GEMINI_API_KEY)
-        
-        if not prompt:
-            # Fall back to heuristic generator if Gemini fails or key is missing
-            prompt = generate_fallback_prompt(clean_html_code)
-            print("  -> Using heuristic fallback prompt.")
-        else:
-            print(f"  -> Gemini generated: \"{prompt}\"")
-        
-        dataset_entry = {
-            "messages": [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": prompt},
-                {"role": "assistant", "content": f"```html\n{cdn_wrapped_html.strip()}\n```"}
-            ]
-        }
-        
-        # Append formatted structure directly to dataset 
-        with open(filepath, "a", encoding="utf-8") as f:
-            f.write(json.dumps(dataset_entry) + "\n")
-            
-        appended_count += 1
-
-    print(f"\nFinished processing! Appended {appended_count} examples directly into '{filepath}'.")
\ No newline at end of file
+
+def read_urls(args, crawler):
+    urls = list(args.url or [])
+    if args.url_file:
+        with open(args.url_file, "r", encoding="utf-8") as f:
+            urls += [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    if args.sitemap:
+        urls += crawler.sitemap_urls(args.sitemap, args.include)
+    # Keep the first occurrence of every URL, in order
+    return list(dict.fromkeys(urls or [DEFAULT_URL]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Crawl Flowbite documentation pages into chat training samples")
+    parser.add_argument("--url", action="append", help="Documentation page to scrape (repeatable)")
+    parser.add_argument("--url-file", help="Text file with one page URL per line")
+    parser.add_argument("--sitemap", help="Sitemap URL whose <loc> entries are crawled")
+    parser.add_argument("--include", default="https://flowbite.com/docs/", help="Only crawl sitemap URLs with this prefix")
+    parser.add_argument("--output", default=filepath)
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent page downloads")
+    parser.add_argument("--rate", type=float, default=2.0, help="Maximum requests per second per host")
+    parser.add_argument("--cache-dir", default="data/http_cache", help="On-disk HTTP cache ('' disables it)")
+    parser.add_argument("--annotator", choices=["gemini", "fallback"], help="Prompt annotator (defaults to gemini when GEMINI_API_KEY is set)")
+    parser.add_argument("--annotator-endpoint", default=GEMINI_ENDPOINT, help="generateContent URL, e.g. a local stub server")
+    parser.add_argument("--annotator-workers", type=int, default=4, help="Concurrent annotation requests")
+    parser.add_argument("--annotation-cache", default="data/annotation_cache.jsonl", help="Persistent annotation cache ('' disables it)")
+    args = parser.parse_args()
+
+    has_key = GEMINI_API_KEY not in PLACEHOLDER_KEYS
+    custom_endpoint = args.annotator_endpoint != GEMINI_ENDPOINT
+    if (args.annotator or ("gemini" if has_key or custom_endpoint else "fallback")) == "gemini":
+        annotator = GeminiAnnotator(GEMINI_API_KEY if has_key else None, args.annotator_endpoint, pool_size=args.annotator_workers)
+    else:
+        annotator = FallbackAnnotator()
+    cache = AnnotationCache(args.annotation_cache) if args.annotation_cache else None
+    print(f"Annotating with '{annotator.name}' ({args.annotator_workers} concurrent requests).")
+
+    crawler = Crawler(workers=args.workers, rate=args.rate, cache_dir=args.cache_dir or None)
+    urls = read_urls(args, crawler)
+    print(f"Crawling {len(urls)} Flowbite documentation pages with {args.workers} workers...")
+
+    # Set up destination output directory
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    appended_count = 0
+    skipped_count = 0
+    seen = set()
+    # Prompts are regenerated on every run, so samples already in the dataset are matched on their HTML
+    existing_keys = read_keys(args.output, key=answer_key)
+    sources = {}
+
+    # One buffered writer for the whole run instead of reopening the dataset for every example
+    with open(args.output, "a", encoding="utf-8") as out:
+        for url, page_html in crawler.fetch_all(urls):
+            if page_html is None:
+                continue
+            html_blocks = extract_html_blocks(page_html, seen)
+            answers = {}
+            for clean_html_code in html_blocks:
+                answer = f"```html\n{wrap_with_cdn(clean_html_code).strip()}\n```"
+                key = answer_key({"messages": [{"role": "assistant", "content": answer}]})
+                if key not in existing_keys:
+                    existing_keys.add(key)
+                    answers[clean_html_code] = answer
+            skipped_count += len(html_blocks) - len(answers)
+            html_blocks = list(answers)
+            print(f"Found {len(html_blocks)} new pure HTML code layouts on {url}")
+
+            # Generate prompts for the whole page concurrently, falling back to the heuristics per block
+            annotations = annotate_blocks(html_blocks, annotator, cache, args.annotator_workers)
+            for idx, (clean_html_code, (prompt, source)) in enumerate(zip(html_blocks, annotations)):
+                sources[source] = sources.get(source, 0) + 1
+                print(f"[{idx+1}/{len(html_blocks)}] {source}: \"{prompt}\"")
+
+                dataset_entry = {
+                    "messages": [
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": prompt},
+                        {"role": "assistant", "content": answers[clean_html_code]}
+                    ]
+                }
+                out.write(json.dumps(dataset_entry) + "\n")
+                appended_count += 1
+
+    counts = crawler.counts
+    print(f"\nPages: {counts['fetched']} downloaded, {counts['not_modified']} unchanged (cache), {counts['failed']} failed.")
+    print(f"Prompts: {', '.join(f'{count} from {source}' for source, count in sources.items()) or 'none'}.")
+    print(f"Finished processing! Appended {appended_count} examples directly into '{args.output}' ({skipped_count} already present).")
+
+
+if __name__ == "__main__":
+    main()
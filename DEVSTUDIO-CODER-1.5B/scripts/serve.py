@@ -0,0 +1,358 @@
+# scripts/serve.py
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from contextlib import nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from devstudio_runtime import load_model, stream_generate, SystemPromptCache
+from batching import BatchScheduler
+from response_cache import ResponseCache, model_identity
+from speculative import NgramDrafter, build_phrase_table, stream_speculative
+from adapters import AdapterRegistry, find_adapters
+
+
+class InferenceService:
+    """Keeps one loaded model resident and serializes access to it across request threads."""
+
+    def __init__(self, tokenizer, model, model_name, max_new_tokens_limit=1024, model_id=None):
+        self.tokenizer = tokenizer
+        self.model = model
+        self.model_name = model_name
+        self.model_id = model_id or model_name
+        self.max_new_tokens_limit = max_new_tokens_limit
+        self.lock = threading.Lock()
+        self.scheduler = None
+        self.prefix_caches = {}
+        self.response_cache = None
+        self.drafter = None
+        self.adapters = None
+        self.default_adapter = None
+        self.adapter_model_ids = {}
+
+    def enable_adapters(self, paths, default=None):
+        # Must run before the other features so they all see the adapter-wrapped model
+        self.adapters = AdapterRegistry(self.model)
+        for name, path in paths.items():
+            self.adapters.load(name, path)
+            # Response cache entries of one adapter must never be served for another
+            self.adapter_model_ids[name] = model_identity(path, self.model_id)
+        self.model = self.adapters.model
+        self.default_adapter = default or next(iter(paths))
+        if self.default_adapter not in self.adapters.names():
+            raise ValueError(f"Unknown default adapter '{self.default_adapter}'")
+
+    def activate(self, adapter):
+        return self.adapters.use(adapter) if self.adapters is not None else nullcontext()
+
+    def enable_speculative(self, train_file):
+        # Greedy requests are decoded with n-gram drafts verified in one forward pass
+        phrase_table = build_phrase_table(self.tokenizer, train_file) if train_file and os.path.exists(train_file) else {}
+        self.drafter = NgramDrafter(phrase_table)
+        return len(phrase_table)
+
+    def enable_response_cache(self, max_entries, cache_dir=None):
+        self.response_cache = ResponseCache(max_entries, cache_dir)
+
+    def enable_prefix_cache(self):
+        # LoRA changes the key/value projections, so each adapter needs its own system-prompt cache
+        for adapter in (self.adapters.names() if self.adapters is not None else [None]):
+            with self.activate(adapter):
+                self.prefix_caches[adapter] = SystemPromptCache(self.model, self.tokenizer)
+        return self.prefix_caches[self.default_adapter]
+
+    def enable_batching(self, window_ms, max_batch_size):
+        # Non-streaming requests are gathered into padded batches; streams keep the direct path
+        self.scheduler = BatchScheduler(self.model, self.tokenizer, self.lock, window_ms, max_batch_size, adapters=self.adapters)
+
+    def parse_request(self, body):
+        messages = body.get("messages")
+        if not isinstance(messages, list) or not messages:
+            raise ValueError("'messages' must be a non-empty list of {role, content} objects")
+        for message in messages:
+            if not isinstance(message, dict) or "role" not in message or "content" not in message:
+                raise ValueError("Every message needs a 'role' and a 'content'")
+
+        adapter = body.get("adapter")
+        if adapter is not None and self.adapters is None:
+            raise ValueError("Adapter selection needs the server to be started with --adapters")
+        if self.adapters is not None:
+            adapter = adapter or self.default_adapter
+            if adapter not in self.adapters.names():
+                raise ValueError(f"Unknown adapter '{adapter}' (available: {', '.join(self.adapters.names())})")
+
+        max_new_tokens = int(body.get("max_new_tokens", body.get("max_tokens", self.max_new_tokens_limit)))
+        seed = body.get("seed")
+        return {
+            "messages": messages,
+            "max_new_tokens": max(1, min(max_new_tokens, self.max_new_tokens_limit)),
+            "temperature": float(body.get("temperature", 0.2)),
+            "seed": int(seed) if seed is not None else None,
+            "adapter": adapter
+        }
+
+    def generation_args(self, request):
+        return {key: value for key, value in request.items() if key != "adapter"}
+
+    def lookup(self, request):
+        """Returns the cache key for a request and the cached response, if any."""
+        if self.response_cache is None:
+            return None, None
+
+        start = time.perf_counter()
+        model_id = self.adapter_model_ids.get(request["adapter"], self.model_id)
+        key = self.response_cache.key(model_id=model_id, **self.generation_args(request))
+        hit = self.response_cache.get(key)
+        if hit is not None:
+            seconds = round(time.perf_counter() - start, 4)
+            hit = dict(hit, stats=dict(hit["stats"], cache_hit=True, ttft_seconds=seconds, total_seconds=seconds))
+        return key, hit
+
+    def store(self, key, content, stats):
+        if self.response_cache is not None:
+            self.response_cache.put(key, {"content": content, "stats": stats})
+
+    def stream(self, request, stats):
+        key, hit = self.lookup(request)
+        if hit is not None:
+            stats.update(hit["stats"])
+            yield hit["content"]
+            return
+
+        pieces = []
+        with self.lock, self.activate(request["adapter"]):
+            prefix_cache = self.prefix_caches.get(request["adapter"])
+            if self.drafter is not None and not request["temperature"]:
+                chunks = stream_speculative(
+                    self.model, self.tokenizer, request["messages"], self.drafter,
+                    request["max_new_tokens"], stats=stats, prefix_cache=prefix_cache
+                )
+            else:
+                chunks = stream_generate(self.model, self.tokenizer, stats=stats, prefix_cache=prefix_cache, **self.generation_args(request))
+
+            # Close the inner generator before the lock is released: a cancelled stream must have
+            # stopped its worker thread before the next request (or adapter switch) uses the model
+            try:
+                for text in chunks:
+                    pieces.append(text)
+                    yield text
+            finally:
+                chunks.close()
+
+        # Only fully generated responses reach this point; cancelled streams are never cached
+        stats["cache_hit"] = False
+        if request["adapter"] is not None:
+            stats["adapter"] = request["adapter"]
+        self.store(key, "".join(pieces), dict(stats))
+
+    def complete(self, request):
+        # Seeded sampling must not share a batch, otherwise the output depends on its batch mates
+        seeded = request["seed"] is not None and request["temperature"] > 0
+        speculative = self.drafter is not None and not request["temperature"]
+        if self.scheduler is None or seeded or speculative:
+            stats = {}
+            content = "".join(self.stream(request, stats))
+            return content, stats
+
+        key, hit = self.lookup(request)
+        if hit is not None:
+            return hit["content"], hit["stats"]
+
+        content, stats = self.scheduler.submit(request["messages"], request["max_new_tokens"], request["temperature"], request["adapter"]).result()
+        stats["cache_hit"] = False
+        if request["adapter"] is not None:
+            stats["adapter"] = request["adapter"]
+        self.store(key, content, dict(stats))
+        return content, stats
+
+    def metrics(self):
+        metrics = {"batching": self.scheduler is not None, "cold_start": getattr(self.model, "cold_start", {})}
+        if self.scheduler is not None:
+            metrics.update(self.scheduler.metrics())
+        if self.response_cache is not None:
+            metrics["response_cache"] = self.response_cache.stats()
+        if self.adapters is not None:
+            metrics["adapters"] = self.adapters.metrics()
+        return metrics
+
+
+class CompletionHandler(BaseHTTPRequestHandler):
+    service = None
+
+    def log_message(self, format, *args):
+        print(f"[serve] {self.address_string()} - {format % args}")
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/health":
+            health = {"status": "ok", "model": self.service.model_name}
+            if self.service.adapters is not None:
+                health.update(adapters=self.service.adapters.names(), default_adapter=self.service.default_adapter)
+            self.send_json(200, health)
+        elif self.path == "/metrics":
+            self.send_json(200, self.service.metrics())
+        else:
+            self.send_json(404, {"error": f"Unknown route {self.path}"})
+
+    def do_POST(self):
+        if self.path != "/v1/chat/completions":
+            self.send_json(404, {"error": f"Unknown route {self.path}"})
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(body, dict):
+                raise ValueError("Request body must be a JSON object")
+            request = self.service.parse_request(body)
+        except (ValueError, TypeError) as e:
+            self.send_json(400, {"error": str(e)})
+            return
+
+        if body.get("stream"):
+            self.stream_completion(request)
+        else:
+            self.complete(request)
+
+    def complete(self, request):
+        try:
+            content, stats = self.service.complete(request)
+        except Exception as e:
+            print(f"[serve] Generation failed: {e!r}")
+            self.send_json(500, {"error": f"Generation failed: {e}"})
+            return
+        log_stats(stats)
+        self.send_json(200, {
+            "object": "chat.completion",
+            "model": self.service.model_name,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": stats["prompt_tokens"], "completion_tokens": stats["generated_tokens"]},
+            "stats": stats
+        })
+
+    def stream_completion(self, request):
+        # Server-sent events: one chunk per decoded piece of text, then the timing stats
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+
+        stats = {}
+        chunks = self.service.stream(request, stats)
+        try:
+            for text in chunks:
+                self.send_event({
+                    "object": "chat.completion.chunk",
+                    "model": self.service.model_name,
+                    "choices": [{"index": 0, "delta": {"content": text}, "finish_reason": None}]
+                })
+            log_stats(stats)
+            self.send_event({
+                "object": "chat.completion.chunk",
+                "model": self.service.model_name,
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                "stats": stats
+            })
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # Closing the generator cancels the generation so the model is freed for the next request
+            chunks.close()
+            print("[serve] Client disconnected, generation cancelled.")
+
+    def send_event(self, payload):
+        self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode("utf-8"))
+        self.wfile.flush()
+
+
+def log_stats(stats):
+    if stats.get("cache_hit"):
+        print(f"[serve] Cache hit | {stats['generated_tokens']} tokens returned in {stats['total_seconds']:.4f}s")
+        return
+    batch = f" | batch {stats['batch_size']}, queued {stats['queue_wait_seconds']:.3f}s" if "batch_size" in stats else ""
+    prefix = f" | prefill saved {stats['prefill_saved_seconds']:.3f}s" if stats.get("prefill_saved_seconds") else ""
+    drafts = f" | draft acceptance {stats['acceptance_rate']:.1%}" if "acceptance_rate" in stats else ""
+    adapter = f" | adapter {stats['adapter']}" if "adapter" in stats else ""
+    print(
+        f"[serve] {stats['prompt_tokens']} prompt + {stats['generated_tokens']} generated tokens | "
+        f"TTFT {stats['ttft_seconds']:.3f}s | {stats['tokens_per_second']:.2f} tokens/sec{batch}{prefix}{drafts}{adapter}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Long-running local DevStudio-1.5B inference server")
+    parser.add_argument("--model", help="Merged or base model directory (defaults to models/final_merged, or models/base with --adapters)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--max-new-tokens", type=int, default=1024, help="Upper bound for any single request")
+    parser.add_argument("--batch-window-ms", type=float, default=0, help="Gather concurrent non-streaming requests for this long (0 disables batching)")
+    parser.add_argument("--max-batch-size", type=int, default=8)
+    parser.add_argument("--quantize", choices=["int8"], help="Run on CPU with int8 dynamically quantized Linear layers")
+    parser.add_argument("--cache-size", type=int, default=256, help="In-memory response cache entries (0 disables the cache)")
+    parser.add_argument("--cache-dir", help="Optional directory for an on-disk response cache tier")
+    parser.add_argument("--speculative", action="store_true", help="Use prompt-lookup speculative decoding for greedy (temperature 0) requests")
+    parser.add_argument("--train-file", default="data/train.jsonl", help="Phrase table source for --speculative")
+    parser.add_argument("--no-prefix-cache", action="store_true", help="Recompute the system-prompt prefill on every request")
+    parser.add_argument("--adapters", help="'auto' for models/final and every checkpoint, or comma-separated adapter directories")
+    parser.add_argument("--default-adapter", help="Adapter used when a request does not name one ('base' disables adapters)")
+    args = parser.parse_args()
+
+    adapter_paths = {}
+    if args.adapters:
+        if args.quantize:
+            sys.exit("Error: --adapters cannot be combined with --quantize (LoRA layers need the unquantized Linear layers).")
+        if args.adapters == "auto":
+            adapter_paths = find_adapters()
+        else:
+            adapter_paths = {os.path.basename(os.path.normpath(path)): path for path in args.adapters.split(",")}
+        if not adapter_paths:
+            sys.exit("Error: no adapter weights found under models/final or models/checkpoints.")
+    args.model = args.model or ("models/base" if adapter_paths else "models/final_merged")
+
+    try:
+        tokenizer, model = load_model(args.model, quantize=args.quantize)
+    except FileNotFoundError as e:
+        print(f"Error: {e}")
+        print("Run 'python scripts/merge_lora.py' or pass --model models/base.")
+        sys.exit(1)
+
+    service = InferenceService(tokenizer, model, args.model, args.max_new_tokens, model_identity(args.model, args.quantize))
+    if adapter_paths:
+        service.enable_adapters(adapter_paths, args.default_adapter)
+        print(f"Serving adapters {', '.join(service.adapters.names())} (default '{service.default_adapter}').")
+    if args.cache_size > 0:
+        service.enable_response_cache(args.cache_size, args.cache_dir)
+    if args.speculative:
+        ngrams = service.enable_speculative(args.train_file)
+        print(f"Speculative decoding enabled for greedy requests ({ngrams} phrase-table n-grams).")
+    if not args.no_prefix_cache:
+        cache = service.enable_prefix_cache()
+        print(f"Cached the {cache.prefix_length}-token system prompt prefix ({cache.prefill_seconds:.3f}s prefill per request saved).")
+    if args.batch_window_ms > 0:
+        service.enable_batching(args.batch_window_ms, args.max_batch_size)
+        print(f"Dynamic batching enabled: {args.batch_window_ms}ms window, up to {args.max_batch_size} requests per batch.")
+
+    CompletionHandler.service = service
+    server = ThreadingHTTPServer((args.host, args.port), CompletionHandler)
+
+    print(f"DevStudio-1.5B is serving on http://{args.host}:{args.port}/v1/chat/completions")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nShutting down...")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
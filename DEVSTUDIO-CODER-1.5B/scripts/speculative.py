@@ -0,0 +1,301 @@
+# scripts/speculative.py
+import os
+import json
+import time
+import argparse
+import torch
+from transformers import DynamicCache, StoppingCriteriaList, LogitsProcessorList, RepetitionPenaltyLogitsProcessor, NoRepeatNGramLogitsProcessor
+
+from devstudio_runtime import load_model, load_prompts, render_prompt, HtmlCompletionCriteria
+
+
+def build_phrase_table(tokenizer, train_file, min_ngram=2, max_ngram=4, num_draft_tokens=8):
+    """Maps n-grams of assistant answers in the training set to the tokens that followed them.
+
+    Scraped samples share the same CDN wrapper and many class strings, so these continuations
+    are good drafts even before the current output has repeated itself.
+    """
+    table = {}
+    with open(train_file, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            for message in json.loads(line)["messages"]:
+                if message["role"] != "assistant":
+                    continue
+                tokens = tokenizer(message["content"])["input_ids"]
+                for end in range(min_ngram - 1, len(tokens) - 1):
+                    continuation = tuple(tokens[end + 1:end + 1 + num_draft_tokens])
+                    for n in range(min_ngram, max_ngram + 1):
+                        if end - n + 1 >= 0:
+                            table.setdefault(tuple(tokens[end - n + 1:end + 1]), continuation)
+    return table
+
+
+class NgramDrafter:
+    """Drafts the next tokens by matching the latest n-gram against the context and a phrase table.
+
+    The context index is updated incrementally as tokens are accepted, so each draft is a few
+    dict lookups no matter how long the prompt and output get.
+    """
+
+    def __init__(self, phrase_table=None, min_ngram=2, max_ngram=4, num_draft_tokens=8):
+        self.phrase_table = phrase_table or {}
+        self.min_ngram = min_ngram
+        self.max_ngram = max_ngram
+        self.num_draft_tokens = num_draft_tokens
+
+    def reset(self, tokens):
+        self.index = {}
+        self.indexed = 0
+        self.update(tokens)
+
+    def update(self, tokens):
+        # N-grams ending at the last token are left out, so a lookup never matches the suffix itself
+        for end in range(self.indexed, len(tokens) - 1):
+            for n in range(self.min_ngram, self.max_ngram + 1):
+                if end - n + 1 >= 0:
+                    self.index[tuple(tokens[end - n + 1:end + 1])] = end
+        self.indexed = max(self.indexed, len(tokens) - 1)
+
+    def draft(self, tokens, limit=None):
+        limit = self.num_draft_tokens if limit is None else min(limit, self.num_draft_tokens)
+        if limit <= 0:
+            return []
+        for n in range(self.max_ngram, self.min_ngram - 1, -1):
+            if len(tokens) < n:
+                continue
+            key = tuple(tokens[-n:])
+            end = self.index.get(key)
+            if end is not None:
+                return list(tokens[end + 1:end + 1 + limit])
+            if key in self.phrase_table:
+                return list(self.phrase_table[key][:limit])
+        return []
+
+
+def greedy_logits_processors(model):
+    """The logits processors `model.generate(do_sample=False)` applies from the model's generation config.
+
+    Sampling warpers (temperature, top_k, top_p) never change the argmax, so only the
+    processors that reshape greedy choices are needed.
+    """
+    config = model.generation_config
+    processors = LogitsProcessorList()
+    if config.repetition_penalty is not None and config.repetition_penalty != 1.0:
+        processors.append(RepetitionPenaltyLogitsProcessor(config.repetition_penalty))
+    if config.no_repeat_ngram_size:
+        processors.append(NoRepeatNGramLogitsProcessor(config.no_repeat_ngram_size))
+    return processors
+
+
+def speculative_generate(model, tokenizer, input_ids, drafter, max_new_tokens=1024, stopping_criteria=None, prefix_cache=None, stats=None):
+    """Greedy decoding that verifies n-gram drafts in a single forward pass per step.
+
+    Yields the list of newly accepted token ids after every step. Every verified position goes
+    through the same logits processors and stopping checks as `model.generate`, so the accepted
+    tokens are exactly the ones plain greedy decoding would produce, just several per forward
+    pass when drafts hit.
+    """
+    stop_token_ids = {tokenizer.eos_token_id, tokenizer.convert_tokens_to_ids("<|im_end|>")}
+    tokens = input_ids[0].tolist()
+    drafter.reset(tokens)
+    processors = greedy_logits_processors(model)
+
+    def next_token(scores, context):
+        if processors:
+            scores = processors(torch.tensor([context], device=input_ids.device), scores[None])[0]
+        return int(scores.argmax())
+
+    # The cache always holds every token except the last accepted one
+    if prefix_cache is not None and prefix_cache.matches(input_ids):
+        past_key_values = prefix_cache.copy()
+        prefill_ids = input_ids[:, prefix_cache.prefix_length:]
+    else:
+        past_key_values = DynamicCache()
+        prefill_ids = input_ids
+
+    drafted = accepted_total = forward_passes = generated = 0
+    with torch.no_grad():
+        outputs = model(input_ids=prefill_ids, past_key_values=past_key_values, use_cache=True)
+        forward_passes += 1
+        new_tokens = [next_token(outputs.logits[0, -1], tokens)]
+
+        while True:
+            # Check the stop conditions after every token, so output ends exactly where generate() would stop
+            finished = False
+            for count, token in enumerate(new_tokens, 1):
+                tokens.append(token)
+                generated += 1
+                finished = generated >= max_new_tokens or token in stop_token_ids
+                if not finished and stopping_criteria is not None:
+                    finished = bool(stopping_criteria(torch.tensor([tokens], device=input_ids.device), None)[0])
+                if finished:
+                    new_tokens = new_tokens[:count]
+                    break
+            yield new_tokens
+            if finished:
+                break
+
+            drafter.update(tokens)
+            draft = drafter.draft(tokens, limit=max_new_tokens - generated - 1)
+            cache_length = past_key_values.get_seq_length()
+
+            # Verify the last accepted token plus every draft token in one pass
+            candidate = torch.tensor([[tokens[-1]] + draft], device=input_ids.device)
+            outputs = model(input_ids=candidate, past_key_values=past_key_values, use_cache=True)
+            forward_passes += 1
+
+            # Position i predicts the token after tokens + draft[:i]; stop at the first disagreement
+            accepted = 0
+            prediction = next_token(outputs.logits[0, 0], tokens)
+            while accepted < len(draft) and draft[accepted] == prediction:
+                accepted += 1
+                prediction = next_token(outputs.logits[0, accepted], tokens + draft[:accepted])
+            drafted += len(draft)
+            accepted_total += accepted
+
+            # Drop the cache entries of rejected draft tokens
+            past_key_values.crop(cache_length + 1 + accepted)
+            new_tokens = draft[:accepted] + [prediction]
+
+    if stats is not None:
+        stats.update({
+            "drafted_tokens": drafted,
+            "accepted_tokens": accepted_total,
+            "acceptance_rate": round(accepted_total / drafted, 4) if drafted else 0.0,
+            "forward_passes": forward_passes,
+            "tokens_per_forward": round(generated / forward_passes, 3) if forward_passes else 0.0
+        })
+
+
+def stream_speculative(model, tokenizer, messages, drafter, max_new_tokens=1024, stats=None, prefix_cache=None, stop_at_document_end=True):
+    """Text-streaming wrapper around `speculative_generate` with the same stats as `stream_generate`."""
+    inputs = tokenizer(render_prompt(tokenizer, messages), return_tensors="pt").to(model.device)
+    stopping_criteria = None
+    if stop_at_document_end:
+        stopping_criteria = StoppingCriteriaList([HtmlCompletionCriteria(tokenizer, inputs["input_ids"].shape[1])])
+
+    step_stats = {}
+    generated_ids = []
+    text = ""
+    start = time.perf_counter()
+    first_token_time = None
+    for new_tokens in speculative_generate(model, tokenizer, inputs["input_ids"], drafter, max_new_tokens, stopping_criteria, prefix_cache, step_stats):
+        if first_token_time is None:
+            first_token_time = time.perf_counter()
+        generated_ids.extend(new_tokens)
+        decoded = tokenizer.decode(generated_ids, skip_special_tokens=True)
+        # Hold back a trailing partial character until the next tokens complete it
+        if not decoded.endswith("\ufffd") and len(decoded) > len(text):
+            yield decoded[len(text):]
+            text = decoded
+
+    decoded = tokenizer.decode(generated_ids, skip_special_tokens=True)
+    if len(decoded) > len(text):
+        yield decoded[len(text):]
+
+    if stats is not None:
+        end_time = time.perf_counter()
+        first_token_time = first_token_time or end_time
+        decode_time = end_time - first_token_time
+        stats.update(step_stats)
+        stats.update({
+            "prompt_tokens": inputs["input_ids"].shape[1],
+            "generated_tokens": len(generated_ids),
+            "ttft_seconds": round(first_token_time - start, 4),
+            "total_seconds": round(end_time - start, 4),
+            "tokens_per_second": round((len(generated_ids) - 1) / decode_time, 2) if len(generated_ids) > 1 and decode_time > 0 else 0.0
+        })
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare prompt-lookup speculative decoding against plain greedy decoding")
+    parser.add_argument("--model", default="models/final_merged")
+    parser.add_argument("--train-file", default="data/train.jsonl", help="Source of the draft phrase table")
+    parser.add_argument("--val-file", default="data/validation.jsonl")
+    parser.add_argument("--limit", type=int, help="Only use the first N validation prompts")
+    parser.add_argument("--max-new-tokens", type=int, default=1024)
+    parser.add_argument("--num-draft-tokens", type=int, default=8)
+    parser.add_argument("--report", default="outputs/speculative_report.json")
+    args = parser.parse_args()
+
+    tokenizer, model = load_model(args.model)
+
+    print(f"Building draft phrase table from '{args.train_file}'...")
+    phrase_table = build_phrase_table(tokenizer, args.train_file, num_draft_tokens=args.num_draft_tokens)
+    drafter = NgramDrafter(phrase_table, num_draft_tokens=args.num_draft_tokens)
+    print(f"Phrase table holds {len(phrase_table)} n-grams.")
+
+    rows = []
+    samples = load_prompts(args.val_file, args.limit)
+    for idx, sample in enumerate(samples):
+        inputs = tokenizer(render_prompt(tokenizer, sample["messages"]), return_tensors="pt").to(model.device)
+        prompt_length = inputs["input_ids"].shape[1]
+
+        start = time.perf_counter()
+        with torch.no_grad():
+            outputs = model.generate(
+                **inputs,
+                max_new_tokens=args.max_new_tokens,
+                do_sample=False,
+                eos_token_id=tokenizer.eos_token_id,
+                stopping_criteria=StoppingCriteriaList([HtmlCompletionCriteria(tokenizer, prompt_length)])
+            )
+        greedy_seconds = time.perf_counter() - start
+        greedy_ids = outputs[0][prompt_length:].tolist()
+
+        stats = {}
+        start = time.perf_counter()
+        speculative_ids = [
+            token
+            for step in speculative_generate(
+                model, tokenizer, inputs["input_ids"], drafter, args.max_new_tokens,
+                StoppingCriteriaList([HtmlCompletionCriteria(tokenizer, prompt_length)]), stats=stats
+            )
+            for token in step
+        ]
+        speculative_seconds = time.perf_counter() - start
+
+        rows.append(dict(
+            stats,
+            greedy_tokens=len(greedy_ids),
+            speculative_tokens=len(speculative_ids),
+            greedy_seconds=round(greedy_seconds, 3),
+            speculative_seconds=round(speculative_seconds, 3),
+            speedup=round(greedy_seconds / speculative_seconds, 3) if speculative_seconds else 0.0,
+            # Numerical noise between batched verification and single steps can flip near-ties
+            identical=greedy_ids == speculative_ids
+        ))
+        print(
+            f"[{idx + 1}/{len(samples)}] acceptance {stats['acceptance_rate']:.2%} | "
+            f"{stats['tokens_per_forward']:.2f} tokens/forward | speedup {rows[-1]['speedup']:.2f}x"
+        )
+
+    drafted = sum(r["drafted_tokens"] for r in rows)
+    greedy_total = sum(r["greedy_seconds"] for r in rows)
+    speculative_total = sum(r["speculative_seconds"] for r in rows)
+    totals = {
+        "prompts": len(rows),
+        "acceptance_rate": round(sum(r["accepted_tokens"] for r in rows) / drafted, 4) if drafted else 0.0,
+        "greedy_seconds": round(greedy_total, 3),
+        "speculative_seconds": round(speculative_total, 3),
+        "speedup": round(greedy_total / speculative_total, 3) if speculative_total else 0.0,
+        "identical_outputs": sum(r["identical"] for r in rows)
+    }
+
+    print("\n" + "=" * 60)
+    print("SPECULATIVE DECODING REPORT")
+    print("=" * 60)
+    print(f"Acceptance rate : {totals['acceptance_rate']:.2%}")
+    print(f"Wall time       : {totals['greedy_seconds']}s -> {totals['speculative_seconds']}s ({totals['speedup']}x)")
+    print(f"Identical output: {totals['identical_outputs']}/{totals['prompts']}")
+
+    os.makedirs(os.path.dirname(args.report) or ".", exist_ok=True)
+    with open(args.report, "w", encoding="utf-8") as f:
+        json.dump({"totals": totals, "samples": rows}, f, indent=2)
+    print(f"\nReport saved to '{args.report}'.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,57 +1,128 @@
 # scripts/split_dataset.py
 import os
-import random
-import json
-
-source_file = "data/train.jsonl"
-train_file = "data/train2.jsonl"
-val_file = "data/validation.jsonl"
-test_file = "data/test.jsonl"
-
-if not os.path.exists(source_file):
-    print(f"Error: Source dataset file '{source_file}' not found. Make sure you have populated data first.")
-else:
-    print(f"Reading dataset from: {source_file}")
-    
-    with open(source_file, "r", encoding="utf-8") as f:
-        lines = [line.strip() for line in f if line.strip()]
-        
-    total_samples = len(lines)
-    
+import math
+import hashlib
+import argparse
+
+from deduplicate import iter_records, record_key
+
+# Component categories for stratified splits, matched in order against the user prompt
+CATEGORIES = [
+    ("landing", ["landing", "lander", "homepage", "website", "site", "portfolio", "hero"]),
+    ("navigation", ["nav", "menu", "sidebar", "header", "footer", "breadcrumb", "pagination", "drawer"]),
+    ("form", ["form", "input", "login", "upload", "search", "select", "subscribe", "date", "switch", "toggle"]),
+    ("commerce", ["pricing", "plan", "checkout", "product", "store", "shop", "cart"]),
+    ("dashboard", ["dashboard", "chart", "metric", "stats", "table", "kanban", "calendar", "feed"]),
+    ("feedback", ["alert", "modal", "toast", "banner", "empty", "404", "loading", "skeleton", "progress", "stepper"]),
+    ("card", ["card", "profile", "testimonial", "gallery", "grid"]),
+]
+SPLITS = ["train", "validation", "test"]
+
+
+def component_category(record):
+    """Coarse component type of a sample; conversations without HTML answers count as "identity"."""
+    answer = "\n".join(m["content"] for m in record["messages"] if m["role"] == "assistant")
+    if "```html" not in answer:
+        return "identity"
+    prompt = " ".join(m["content"] for m in record["messages"] if m["role"] == "user").lower()
+    for category, keywords in CATEGORIES:
+        if any(keyword in prompt for keyword in keywords):
+            return category
+    return "other"
+
+
+def hash_fraction(key, seed):
+    """Maps a sample key to a stable number in [0, 1) that does not depend on any other sample."""
+    digest = hashlib.sha256(f"{seed}:{key}".encode("utf-8")).hexdigest()
+    return int(digest[:16], 16) / 2**64
+
+
+def hashed_split(fraction, ratios):
+    cumulative = 0.0
+    for split in SPLITS:
+        cumulative += ratios[split]
+        if fraction < cumulative:
+            return split
+    return SPLITS[-1]
+
+
+def stratified_split(fraction, ratios, counts):
+    """Hash-based split, corrected whenever a split of this category falls a whole sample behind its share.
+
+    `counts` only holds the earlier samples of the same category, so a sample's split depends on
+    nothing after it and appending new samples never moves old ones.
+    """
+    seen = sum(counts.values()) + 1
+    deficits = {split: ratios[split] * seen - counts[split] for split in SPLITS}
+    split = hashed_split(fraction, ratios)
+    lacking = [s for s in SPLITS if counts[s] < math.floor(ratios[s] * seen)]
+    if lacking and split not in lacking:
+        split = max(lacking, key=deficits.get)
+    counts[split] += 1
+    return split
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream a chat JSONL dataset into stable, hash-assigned train/validation/test splits")
+    parser.add_argument("--input", default="data/train.jsonl")
+    parser.add_argument("--train-file", default="data/train2.jsonl")
+    parser.add_argument("--val-file", default="data/validation.jsonl")
+    parser.add_argument("--test-file", default="data/test.jsonl")
+    parser.add_argument("--val-ratio", type=float, default=0.1)
+    parser.add_argument("--test-ratio", type=float, default=0.1)
+    parser.add_argument("--seed", default="42", help="Salt of the split hash; changing it reshuffles every sample")
+    parser.add_argument("--stratify", action="store_true", help="Keep the split ratios within every component category")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.input):
+        print(f"Error: Source dataset file '{args.input}' not found. Make sure you have populated data first.")
+        return
+
+    ratios = {"train": round(1 - args.val_ratio - args.test_ratio, 6), "validation": args.val_ratio, "test": args.test_ratio}
+    paths = {"train": args.train_file, "validation": args.val_file, "test": args.test_file}
+    print(f"Reading dataset from: {args.input}")
+
+    # Every sample's split is a pure function of its content hash (plus its category's earlier
+    # samples when stratifying), so records are streamed straight to their split files and
+    # re-running after new samples were appended leaves the existing assignments untouched.
+    totals = {split: 0 for split in SPLITS}
+    categories = {}
+    files = {}
+    try:
+        for split in SPLITS:
+            os.makedirs(os.path.dirname(paths[split]) or ".", exist_ok=True)
+            files[split] = open(f"{paths[split]}.tmp", "w", encoding="utf-8")
+
+        for _, line, record in iter_records(args.input):
+            fraction = hash_fraction(record_key(record), args.seed)
+            if args.stratify:
+                counts = categories.setdefault(component_category(record), {split: 0 for split in SPLITS})
+                split = stratified_split(fraction, ratios, counts)
+            else:
+                split = hashed_split(fraction, ratios)
+            files[split].write(line + "\n")
+            totals[split] += 1
+    finally:
+        for f in files.values():
+            f.close()
+
+    for split in SPLITS:
+        os.replace(f"{paths[split]}.tmp", paths[split])
+
+    total_samples = sum(totals.values())
     if total_samples < 10:
         print(f"Warning: Dataset only contains {total_samples} samples. It is highly recommended to have more data before partitioning.")
-    else:
-        # Set a deterministic seed so splits remain reproducible across runs
-        random.seed(42)
-        random.shuffle(lines)
-        
-        # Calculate split sizes (80% Train, 10% Validation, 10% Test)
-        val_size = int(total_samples * 0.1)
-        test_size = int(total_samples * 0.1)
-        train_size = total_samples - val_size - test_size
-        
-        # Slice the shuffled list
-        train_data = lines[:train_size]
-        val_data = lines[train_size : train_size + val_size]
-        test_data = lines[train_size + val_size :]
-        
-        # Overwrite the train.jsonl file with only the training slice
-        with open(train_file, "w", encoding="utf-8") as f:
-            for line in train_data:
-                f.write(line + "\n")
-                
-        # Write validation slice
-        with open(val_file, "w", encoding="utf-8") as f:
-            for line in val_data:
-                f.write(line + "\n")
-                
-        # Write test slice
-        with open(test_file, "w", encoding="utf-8") as f:
-            for line in test_data:
-                f.write(line + "\n")
-                
-        print("\n--- Data Partitioning Complete ---")
-        print(f"Total Source Records Processed: {total_samples}")
-        print(f"Saved to '{train_file}': {len(train_data)} records (80%)")
-        print(f"Saved to '{val_file}': {len(val_data)} records (10%)")
-        print(f"Saved to '{test_file}': {len(test_data)} records (10%)")
\ No newline at end of file
+
+    print("\n--- Data Partitioning Complete ---")
+    print(f"Total Source Records Processed: {total_samples}")
+    for split in SPLITS:
+        share = totals[split] / total_samples if total_samples else 0.0
+        print(f"Saved to '{paths[split]}': {totals[split]} records ({share:.0%}, target {ratios[split]:.0%})")
+    if args.stratify:
+        print("\nPer-category split (train / validation / test):")
+        for category, counts in sorted(categories.items()):
+            print(f"  {category:<11}: {' / '.join(str(counts[split]) for split in SPLITS)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,23 @@
 import os
+import json
 import yaml
+import argparse
 import torch
-from datasets import load_dataset
+import importlib.util
 from transformers import AutoTokenizer, AutoModelForCausalLM, BitsAndBytesConfig
 from peft import LoraConfig, prepare_model_for_kbit_training
 from trl import SFTConfig, SFTTrainer
+from packing import padding_report
+from preprocess import load_or_build
+from profiling import StepProfiler
+
+parser = argparse.ArgumentParser(description="QLoRA SFT training for DevStudio-1.5B")
+parser.add_argument("--config", default="configs/train.yaml", help="Training config (configs/train_smoke.yaml runs a tiny CPU-only check)")
+args = parser.parse_args()
 
 # 1. Load Local Configurations
 print("Loading YAML configurations...")
-with open("configs/train.yaml", "r") as f:
+with open(args.config, "r") as f:
     train_config = yaml.safe_load(f)
 with open("configs/lora.yaml", "r") as f:
     lora_config_dict = yaml.safe_load(f)
@@ -16,13 +25,28 @@ with open("configs/lora.yaml", "r") as f:
 # Ensure checkpoints output folder exists
 os.makedirs(train_config["output_dir"], exist_ok=True)
 
-# 2. Configure 4-bit Quantization (QLoRA)
+packing = train_config.get("packing", False)
+group_by_length = train_config.get("group_by_length", False)
+if packing and group_by_length:
+    raise ValueError("Choose either 'packing' or 'group_by_length' in configs/train.yaml, not both")
+
+# Packed rows rely on position_ids to keep samples from attending to each other, which needs FlashAttention
+if packing and importlib.util.find_spec("flash_attn") is None:
+    raise ImportError("'packing: true' requires the flash-attn package; use 'group_by_length: true' instead")
+
+# 2. Configure 4-bit Quantization (QLoRA); bitsandbytes needs a GPU, so CPU runs train plain LoRA in FP32
+use_cuda = torch.cuda.is_available()
+bf16 = use_cuda and torch.cuda.is_bf16_supported()
+quantize_4bit = use_cuda and train_config.get("quantize_4bit", True)
+if not use_cuda:
+    print("No GPU found. Training plain LoRA in FP32 on cpu...")
+
 bnb_config = BitsAndBytesConfig(
     load_in_4bit=True,
     bnb_4bit_quant_type="nf4",
-    bnb_4bit_compute_dtype=torch.bfloat16 if torch.cuda.is_bf16_supported() else torch.float16,
+    bnb_4bit_compute_dtype=torch.bfloat16 if bf16 else torch.float16,
     bnb_4bit_use_double_quant=True
-)
+) if quantize_4bit else None
 
 # 3. Load Local Model & Tokenizer
 print(f"Loading local base model from '{train_config['model_id']}'...")
@@ -33,23 +57,43 @@ tokenizer.padding_side = "right"  # Required for training stability
 model = AutoModelForCausalLM.from_pretrained(
     train_config["model_id"],
     quantization_config=bnb_config,
-    device_map="auto"
+    torch_dtype=None if quantize_4bit else torch.float32,
+    device_map="auto" if use_cuda else None,
+    attn_implementation="flash_attention_2" if packing else None
 )
 
 # 4. Apply PEFT & Prepare for 4-bit Training
 print("Applying LoRA adapters...")
-model = prepare_model_for_kbit_training(model)
+if quantize_4bit:
+    model = prepare_model_for_kbit_training(model)
 peft_config = LoraConfig(**lora_config_dict)
 
-# 5. Load Dataset Splits
+# 5. Load Dataset Splits (tokenized once with the chat template and cached under data/cache/)
 print("Loading split datasets...")
-dataset_files = {
-    "train": train_config["train_file"],
-    "validation": train_config["val_file"]
-}
-dataset = load_dataset("json", data_files=dataset_files)
+dataset = load_or_build(tokenizer, train_config)
+if train_config.get("max_samples"):
+    for split in dataset:
+        dataset[split] = dataset[split].select(range(min(train_config["max_samples"], len(dataset[split]))))
+
+# Estimate how much of each batch is padding under every batching mode
+lengths = [min(length, train_config["max_length"]) for length in dataset["train"]["length"]]
+batch_report = padding_report(lengths, train_config["per_device_train_batch_size"], train_config["max_length"])
+mode = "packing" if packing else "group_by_length" if group_by_length else "padded"
+print(f"Training on {batch_report['tokens']} tokens in {batch_report['samples']} samples ({mode} batches).")
+for name in ["padded", "group_by_length", "packing"]:
+    marker = " <- selected" if name == mode else ""
+    print(f"  {name:<16} padding ratio: {batch_report[name]['padding_ratio']:.2%}{marker}")
 
 # 6. Initialize Training Configurations
+# packing_strategy only exists in newer TRL releases, so it is passed only when packing is enabled
+packing_args = {"packing_strategy": "bfd"} if packing else {}  # Best-fit decreasing, padding-free rows with per-sample position_ids
+# transformers 5 replaced the group_by_length flag with train_sampling_strategy="group_by_length"
+if not group_by_length:
+    sampling_args = {}
+elif "group_by_length" in SFTConfig.__dataclass_fields__:
+    sampling_args = {"group_by_length": True}
+else:
+    sampling_args = {"train_sampling_strategy": "group_by_length"}
 training_args = SFTConfig(
     output_dir=train_config["output_dir"],
     per_device_train_batch_size=train_config["per_device_train_batch_size"],
@@ -57,11 +101,17 @@ training_args = SFTConfig(
     learning_rate=float(train_config["learning_rate"]),
     logging_steps=train_config["logging_steps"],
     max_length=train_config["max_length"],
+    packing=packing,
+    **packing_args,
+    **sampling_args,
     num_train_epochs=train_config["num_train_epochs"],
+    max_steps=train_config.get("max_steps", -1),
     optim=train_config["optim"],
-    fp16=not torch.cuda.is_bf16_supported(),
-    bf16=torch.cuda.is_bf16_supported(),
+    fp16=use_cuda and not bf16,
+    bf16=bf16,
+    use_cpu=not use_cuda,
     save_strategy=train_config["save_strategy"],
+    save_steps=train_config.get("save_steps", 500),
     save_total_limit=2,           # Keeps only the latest 2 checkpoints to prevent disk full errors
     report_to=train_config["report_to"],
     eval_strategy="epoch",        # Evaluates validation loss at the end of each epoch
@@ -78,6 +128,12 @@ trainer = SFTTrainer(
     args=training_args,
 )
 
+# Per-step phase timings, tokens/sec, padding and memory (written to outputs/train_profile*.json*)
+if train_config.get("profile", False):
+    profiler = StepProfiler()
+    trainer.data_collator = profiler.wrap_collator(trainer.data_collator)
+    trainer.add_callback(profiler)
+
 # 8. Check for Existing Checkpoints to Auto-Resume Training
 resume_checkpoint = None
 if os.path.exists(train_config["output_dir"]):
@@ -96,13 +152,31 @@ if os.path.exists(train_config["output_dir"]):
 print("\n--- Starting Fine-Tuning Execution ---")
 if resume_checkpoint:
     print(f"Found active checkpoint. Resuming from: {resume_checkpoint}")
-    trainer.train(resume_from_checkpoint=resume_checkpoint)
+    train_output = trainer.train(resume_from_checkpoint=resume_checkpoint)
 else:
     print("No checkpoints found. Starting a fresh training run...")
-    trainer.train()
+    train_output = trainer.train()
+
+# Effective throughput only counts real (non-padding) tokens, so batching modes are directly comparable
+runtime = train_output.metrics["train_runtime"]
+resumed_step = int(resume_checkpoint.split("-")[-1]) if resume_checkpoint else 0
+# Epoch progress grows linearly with steps, so this also holds for resumed or max_steps-limited runs
+epochs_trained = trainer.state.epoch * (trainer.state.global_step - resumed_step) / trainer.state.global_step if trainer.state.global_step else 0.0
+trained_tokens = batch_report["tokens"] * epochs_trained
+effective_tokens_per_second = trained_tokens / runtime if runtime else 0.0
+print(f"Effective throughput: {effective_tokens_per_second:.1f} tokens/sec ({mode} batches, {runtime:.0f}s)")
+
+os.makedirs("outputs", exist_ok=True)
+with open("outputs/training_throughput.json", "w", encoding="utf-8") as f:
+    json.dump({
+        "mode": mode,
+        "train_runtime": round(runtime, 2),
+        "effective_tokens_per_second": round(effective_tokens_per_second, 2),
+        "padding": batch_report
+    }, f, indent=2)
 
 # 10. Save final adapter weights to models/final/
-adapter_save_dir = "models/final"
+adapter_save_dir = train_config.get("adapter_dir", "models/final")
 os.makedirs(adapter_save_dir, exist_ok=True)
 trainer.model.save_pretrained(adapter_save_dir)
 tokenizer.save_pretrained(adapter_save_dir)
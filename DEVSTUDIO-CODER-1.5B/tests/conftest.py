@@ -0,0 +1,6 @@
+# tests/conftest.py
+import os
+import sys
+
+# The scripts import their siblings directly, as when run with `python scripts/<name>.py`
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
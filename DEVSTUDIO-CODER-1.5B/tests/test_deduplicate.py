@@ -0,0 +1,25 @@
+# tests/test_deduplicate.py
+from array import array
+
+from deduplicate import EMPTY_BIN, minhash, near_duplicate_clusters, shingles
+
+
+def signature(values):
+    return array("Q", values)
+
+
+def test_near_duplicates_found_when_unlike_first_bucket_member():
+    # All three share band 0; docs 1 and 2 agree on 13 of 16 bins, doc 0 only on band 0
+    shared = [1, 2, 3, 4]
+    signatures = {
+        0: signature(shared + [100 + i for i in range(12)]),
+        1: signature(shared + [10, 11, 12, 200, 14, 15, 16, 201, 18, 19, 20, 202]),
+        2: signature(shared + [10, 11, 12, 300, 14, 15, 16, 301, 18, 19, 20, 302]),
+    }
+    assert near_duplicate_clusters(signatures, bands=4, threshold=0.8) == {1: [2]}
+
+
+def test_minhash_signature_is_packed():
+    sig = minhash(shingles("<div class='card p-4'>hello world</div>"), num_perm=16)
+    assert sig.typecode == "Q" and len(sig) == 16
+    assert any(value != EMPTY_BIN for value in sig)
@@ -0,0 +1,33 @@
+# tests/test_preprocess.py
+import json
+
+import pytest
+
+pytest.importorskip("datasets")
+pytest.importorskip("transformers")
+from datasets import load_from_disk
+
+from preprocess import tokenize_split
+
+
+class ChatTokenizer:
+    """Mimics transformers 5, where apply_chat_template(tokenize=True) returns a dict by default."""
+
+    def apply_chat_template(self, messages, tokenize=True, return_dict=True):
+        input_ids = [ord(c) % 97 for m in messages for c in m["content"]]
+        return {"input_ids": input_ids, "attention_mask": [1] * len(input_ids)} if return_dict else input_ids
+
+
+def test_tokenized_column_is_flat_list_of_ints(tmp_path):
+    path = tmp_path / "train.jsonl"
+    messages = [{"role": "user", "content": "make a card"}, {"role": "assistant", "content": "<div>card</div>"}]
+    path.write_text(json.dumps({"messages": messages}) + "\n", encoding="utf-8")
+
+    dataset = tokenize_split(ChatTokenizer(), str(path), max_length=8)
+    dataset.save_to_disk(str(tmp_path / "artifact"))
+    stored = load_from_disk(str(tmp_path / "artifact"))
+
+    input_ids = stored["input_ids"][0]
+    assert isinstance(input_ids, list) and all(isinstance(token, int) for token in input_ids)
+    assert stored["length"][0] == len(input_ids) == len("make a card<div>card</div>")
+    assert stored["over_max_length"][0] is True
@@ -0,0 +1,50 @@
+# tests/test_stopping.py
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("transformers")
+
+from devstudio_runtime import HtmlCompletionCriteria
+
+
+class PieceTokenizer:
+    """Tokenizer stub whose token ids index into a fixed list of text pieces."""
+
+    eos_token_id = 0
+    unk_token_id = None
+
+    def __init__(self, pieces):
+        self.pieces = ["<eos>"] + pieces
+
+    def convert_tokens_to_ids(self, token):
+        return None
+
+    def decode(self, tokens, skip_special_tokens=True):
+        return "".join(self.pieces[token] for token in tokens)
+
+
+def run(pieces):
+    """Feeds the pieces one token at a time and returns the stop decision after each."""
+    tokenizer = PieceTokenizer(pieces)
+    criteria = HtmlCompletionCriteria(tokenizer, prompt_length=1)
+    ids = [0]
+    decisions = []
+    for token in range(1, len(pieces) + 1):
+        ids.append(token)
+        decisions.append(bool(criteria(torch.tensor([ids]), None)[0]))
+    return decisions
+
+
+def test_fence_split_across_tokens():
+    pieces = ["``", "`html\n", "<html><body></body></html>", "\n``", "`", "\nmore"]
+    assert run(pieces) == [False, False, False, False, True, True]
+
+
+def test_preamble_before_fence():
+    pieces = ["Here you go:\n", "```html\n", "<html></html>\n", "```"]
+    assert run(pieces) == [False, False, False, True]
+
+
+def test_unfenced_document_ends_at_html_close():
+    pieces = ["<!DOCTYPE html>\n<html>", "<body></body></", "html>", "\ntrailing"]
+    assert run(pieces) == [False, False, True, True]
@@ -31,10 +31,11 @@ def banner():
 
 
 # Function to send query to the API to scan a particular repo
-def send_query(url,access_token):
+def send_query(url,access_token,diff_only=False):
     payload = {
         "repo_url": url,
-        "access_token": access_token
+        "access_token": access_token,
+        "diff_only": diff_only
     }
     final_url = BASE_URL + '/api/send_query'
     try:
@@ -112,6 +113,7 @@ def main():
     parser.add_argument("--access_token", type=str, help="GitHub access token")
     parser.add_argument("--notification", type=str, help="Notification to push")
     parser.add_argument("--id", help="Notification ID")
+    parser.add_argument("--diff_only", action="store_true", help="Only return findings that are new or fixed since the last scan")
 
     args = parser.parse_args()
     
@@ -128,7 +130,7 @@ def main():
         if not args.access_token:
             print("[❗ Error ] : --access_token is required for scan_repo")
             return
-        send_query(args.url, args.access_token)
+        send_query(args.url, args.access_token, args.diff_only)
 
     elif args.task == "push_notif":
         if not args.url:
@@ -1,9 +1,15 @@
 import ast
+import sys
 import pprint
 
-def format_semgrep_results(data):
+def format_semgrep_results(data, diff_only=False):
     print("\n🔍 SEMGREP FINDINGS REPORT\n" + "=" * 40)
     results = data.get('findings', {}).get('results', [])
+    diff = data.get('diff')
+
+    if diff_only and diff:
+        format_semgrep_diff(results, diff)
+        return
 
     if not results:
         print("✅ No issues found.")
@@ -24,14 +30,43 @@ def format_semgrep_results(data):
         print(f"🔹 Message   : {message}")
         print("-" * 40)
 
+def format_semgrep_diff(results, diff):
+    # Only findings introduced or fixed since the previous scan of this repo
+    new = set(diff.get("new", []))
+    new_results = [issue for issue in results if issue.get("fingerprint") in new]
+    fixed = diff.get("fixed", [])
+
+    if not diff.get("baseline"):
+        print("ℹ️  No previous scan found, every finding is reported as new.")
+
+    print(f"🆕 New: {len(new_results)}  |  ✅ Fixed: {len(fixed)}  |  ⏸️  Unchanged: {diff.get('unchanged_count', 0)}")
+
+    for idx, issue in enumerate(new_results, start=1):
+        print(f"\n🆕 #{idx}:")
+        print(f"🔹 File      : {issue.get('path', 'N/A')}")
+        print(f"🔹 Line      : {issue.get('start', {}).get('line', 'N/A')}")
+        print(f"🔹 Severity  : {issue.get('extra', {}).get('severity', 'UNKNOWN')}")
+        print(f"🔹 Rule ID   : {issue.get('check_id', 'N/A')}")
+        print(f"🔹 Message   : {issue.get('extra', {}).get('message', 'No message provided.')}")
+        print("-" * 40)
+
+    for idx, summary in enumerate(fixed, start=1):
+        print(f"\n✅ Fixed #{idx}:")
+        print(f"🔹 File      : {summary.get('path', 'N/A')}")
+        print(f"🔹 Line      : {summary.get('line', 'N/A')}")
+        print(f"🔹 Rule ID   : {summary.get('check_id', 'N/A')}")
+        print("-" * 40)
+
 if __name__ == "__main__":
+    diff_only = "--diff_only" in sys.argv
+
     with open("return.json", "r") as f:
         raw = f.read()
 
     try:
         # Use ast.literal_eval to safely parse Python-style dict
         data = ast.literal_eval(raw)
-        format_semgrep_results(data)
+        format_semgrep_results(data, diff_only)
     except Exception as e:
         print(f"❌ Failed to parse file: {e}")
 
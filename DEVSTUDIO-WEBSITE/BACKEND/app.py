@@ -4,6 +4,8 @@ from supabase import create_client, Client
 import os
 import subprocess
 import json
+import re
+import hashlib
 from flask_cors import CORS
 from pathlib import Path
 
@@ -17,9 +19,118 @@ SUPABASE_KEY = "eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9.eyJpc3MiOiJzdXBhYmFzZSIsInJ
 supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
 
 
+# ---------------FINDING FINGERPRINTS-------------------
+
+# Previous scan fingerprints are kept per repo so each scan can be diffed against the last one
+BASELINE_DIR = Path.home() / "devstudio" / ".baselines"
+
+
+def normalize_snippet(snippet):
+    # Collapse whitespace so re-indentation or line moves do not change the fingerprint
+    return re.sub(r"\s+", " ", snippet or "").strip()
+
+
+def read_finding_snippet(issue, file_cache):
+    snippet = issue.get("extra", {}).get("lines", "")
+
+    # Semgrep hides the matched lines behind "requires login" without an account, so read them from the clone
+    if snippet and snippet != "requires login":
+        return snippet
+
+    path = issue.get("path", "")
+    if path not in file_cache:
+        try:
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                file_cache[path] = f.read().splitlines()
+        except OSError:
+            file_cache[path] = None
+
+    lines = file_cache[path]
+    if lines is None:
+        return snippet
+
+    start = issue.get("start", {}).get("line", 1)
+    end = issue.get("end", {}).get("line", start)
+    return "\n".join(lines[start - 1:end])
+
+
+def fingerprint_findings(results, clone_path):
+    # Each finding is keyed on rule, repo-relative path and normalized code, never on line numbers
+    file_cache = {}
+    seen = {}
+    for issue in results:
+        path = issue.get("path", "")
+        try:
+            path = str(Path(path).relative_to(clone_path))
+        except ValueError:
+            pass
+
+        snippet = normalize_snippet(read_finding_snippet(issue, file_cache))
+        key = "\0".join([issue.get("check_id", ""), path, snippet])
+
+        # Identical snippets in the same file get an occurrence index so they stay distinct
+        occurrence = seen.get(key, 0)
+        seen[key] = occurrence + 1
+        issue["fingerprint"] = hashlib.sha256(f"{key}\0{occurrence}".encode("utf-8")).hexdigest()
+    return results
+
+
+def baseline_path(repo_name):
+    return BASELINE_DIR / f"{repo_name}.json"
+
+
+def load_baseline(repo_name):
+    path = baseline_path(repo_name)
+    if not path.exists():
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        print(f"[DEBUG] Baseline for {repo_name} is unreadable. Ignoring it.")
+        return None
+
+
+def save_baseline(repo_name, results):
+    BASELINE_DIR.mkdir(parents=True, exist_ok=True)
+    index = {
+        issue["fingerprint"]: {
+            "check_id": issue.get("check_id", "N/A"),
+            "path": issue.get("path", "N/A"),
+            "line": issue.get("start", {}).get("line", "N/A"),
+            "severity": issue.get("extra", {}).get("severity", "UNKNOWN"),
+            "message": issue.get("extra", {}).get("message", "")
+        }
+        for issue in results
+    }
+    with open(baseline_path(repo_name), "w", encoding="utf-8") as f:
+        json.dump(index, f)
+
+
+def diff_findings(results, baseline):
+    # New findings are returned as fingerprints; fixed ones carry their summary from the baseline
+    # Set/dict lookups keep the diff linear in the number of findings
+    current = {issue["fingerprint"] for issue in results}
+    if baseline is None:
+        return {"baseline": False, "new": [issue["fingerprint"] for issue in results], "fixed": [], "unchanged_count": 0}
+
+    new = [issue["fingerprint"] for issue in results if issue["fingerprint"] not in baseline]
+    fixed = [
+        dict(summary, fingerprint=fingerprint)
+        for fingerprint, summary in baseline.items()
+        if fingerprint not in current
+    ]
+    return {
+        "baseline": True,
+        "new": new,
+        "fixed": fixed,
+        "unchanged_count": len(results) - len(new)
+    }
+
+
 # ---------------CRITICAL FUNCTIONS---------------------
 
-def scan_repo(repo_url, access_token):
+def scan_repo(repo_url, access_token, diff_only=False):
     print("[DEBUG] Starting scan for:", repo_url)
 
     # Step 1: Ensure ~/devstudio exists
@@ -67,10 +178,21 @@ def scan_repo(repo_url, access_token):
     findings = json.loads(result.stdout)
     print("[DEBUG] Findings parsed.")
 
+    # Step 7: Fingerprint findings and diff them against the previous scan
+    results = fingerprint_findings(findings.get("results", []), clone_path)
+    diff = diff_findings(results, load_baseline(repo_name))
+    save_baseline(repo_name, results)
+    print(f"[DEBUG] {len(diff['new'])} new, {len(diff['fixed'])} fixed, {diff['unchanged_count']} unchanged findings.")
+
+    if diff_only:
+        new = set(diff["new"])
+        findings["results"] = [issue for issue in results if issue["fingerprint"] in new]
+
     return {
         "status": "success",
         "message": f"Scanned the repo {repo_url}",
-        "findings": findings
+        "findings": findings,
+        "diff": diff
     }
 
 
@@ -153,6 +275,7 @@ def send_query():
 
         repo_url = data.get('repo_url')
         access_token = data.get('access_token')
+        diff_only = bool(data.get('diff_only', False))
 
         if not repo_url:
             return jsonify({"error": "Missing url"}), 400
@@ -164,7 +287,7 @@ def send_query():
         print(f"[-] Recieved repo : {repo_url}")
         print(f"[-] Recieved access token : {access_token}")
 
-        return jsonify(scan_repo(repo_url,access_token)) , 200
+        return jsonify(scan_repo(repo_url,access_token,diff_only)) , 200
 
 
 @app.route('/api/push_notif',methods=['POST'])